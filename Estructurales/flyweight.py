@@ -1,45 +1,314 @@
 from sys import getsizeof
-from collections import deque
+from gc import get_referents
+from types import ModuleType, FunctionType, BuiltinFunctionType
+from math import dist
+from hashlib import blake2b
+from heapq import nsmallest
+from operator import le
+from collections import deque, OrderedDict, Counter
+from weakref import WeakValueDictionary, finalize
+from concurrent.futures import ProcessPoolExecutor
+import json
+import mmap
 import random
+import struct
+import sys
+import threading
+import time
 
 from typing import Union, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 # ============================================================
 # UTILIDAD: Calcular memoria profunda
 # ============================================================
 
-def deep_sizeof(obj, seen=None):
-    if seen is None:
-        seen = set()
+_EMPTY_SLOT = object()
+_SLOT_NAMES = {}
+# Clase -> (se cuenta, se recorren sus referencias, expone un buffer, tiene __dict__)
+_KINDS = {}
+_ATOMIC_TYPES = frozenset((int, float, bool, complex, str, bytes, type(None)))
+_SEQUENCE_TYPES = (list, tuple, set, frozenset, deque)
+# Clases, modulos y funciones son compartidos por todo el programa: no se cuentan
+_SHARED_TYPES = (type, ModuleType, FunctionType, BuiltinFunctionType)
+
+def deep_sizeof(obj, seen=None) -> int:
+    # Bytes de obj y de todo lo que alcanza (contenedores, __dict__, __slots__ y
+    # buffers); lo que ya esta en seen no se vuelve a contar
+    return _traverse([obj], set() if seen is None else seen)
+
+def memory_breakdown(obj, sample:int=None, seed:int=0) -> dict:
+    # Como deep_sizeof, pero desglosado por tipo y por atributo (Clase.atributo,
+    # incluyendo todo lo que cuelga de el). Con sample, de cada contenedor con
+    # mas elementos se miden sample al azar y se extrapola al resto
+    total, by_type, by_attribute = _walk(obj, sample, random.Random(seed))
+    return {
+        'total'        : int(total),
+        'by_type'      : dict(sorted(
+            ((name, (count, int(size))) for name, (count, size) in by_type.items()),
+            key=lambda item: -item[1][1]
+        )),
+        'by_attribute' : dict(sorted(
+            ((label, int(size)) for label, size in by_attribute.items()), key=lambda item: -item[1]
+        )),
+    }
+
+def _traverse(level:list, seen:set, measure:bool=True) -> int:
+    # Recorre por niveles lo alcanzable desde level que no este en seen: los
+    # hijos de todo un nivel salen de una sola llamada a gc.get_referents (que
+    # ya sigue __dict__ y __slots__). Con measure=False solo los marca en seen
+    # y el total no es significativo
+    mark, kinds = seen.add, _KINDS
+    total = 0
+    while level:
+        expand, owners = [], []
+        push = expand.append
+        for item in level:
+            if id(item) in seen:
+                continue
+            mark(id(item))
+            cls = type(item)
+            counted, nested, buffer, attributes = kinds.get(cls) or _kind(cls, item)
+            if counted and measure:
+                total += getsizeof(item)
+            if nested:
+                push(item)
+            if buffer:
+                total += _buffer_size(item, owners)
+            if attributes:
+                # El __dict__ de una instancia puede no existir hasta pedirlo, y
+                # entonces get_referents solo devuelve los valores
+                owners.append(item.__dict__)
+        level = [*get_referents(*expand), *owners]
+    return total
+
+def _kind(cls, example) -> Tuple[bool]:
+    kind = _KINDS.get(cls)
+    if kind is None:
+        if issubclass(cls, _SHARED_TYPES):
+            kind = (False, False, False, False)
+        elif cls in _ATOMIC_TYPES:
+            kind = (True, False, False, False)
+        elif issubclass(cls, (dict, *_SEQUENCE_TYPES)):
+            kind = (True, True, False, False)
+        else:
+            kind = (True, True, _is_buffer(example), isinstance(getattr(example, '__dict__', None), dict))
+        _KINDS[cls] = kind
+    return kind
+
+def _walk(root, sample:int, rng:random.Random):
+    # Recorrido con pila explicita (sin limite de recursion); cada entrada es
+    # (objeto, peso, atributo). El peso es 1 salvo en contenedores muestreados
+    total, seen = 0, set()
+    by_type, by_attribute = {}, {}
+    stack = [(root, 1, '')]
+    pop, push, mark = stack.pop, stack.append, seen.add
+    while stack:
+        obj, weight, label = pop()
+        if id(obj) in seen or isinstance(obj, _SHARED_TYPES):
+            continue
+        mark(id(obj))
+        cls = type(obj)
+        size = getsizeof(obj)
+        named, children = (), ()
+
+        if cls in _ATOMIC_TYPES:
+            pass
+        elif isinstance(obj, dict):
+            children = [item for pair in obj.items() for item in pair]
+        elif isinstance(obj, _SEQUENCE_TYPES):
+            children = obj
+        else:
+            attributes = getattr(obj, '__dict__', None)
+            if isinstance(attributes, dict) and id(attributes) not in seen:
+                mark(id(attributes))
+                size += getsizeof(attributes)
+                named = list(attributes.items())
+            slots = _slot_names(cls)
+            if slots:
+                named = [*named, *(
+                    (name, value) for name in slots
+                    for value in (getattr(obj, name, _EMPTY_SLOT),) if value is not _EMPTY_SLOT
+                )]
+            if not named:
+                children = get_referents(obj)
+            if _kind(cls, obj)[2]:
+                owners = []
+                size += _buffer_size(obj, owners)
+                children = [*children, *owners]
+
+        size *= weight
+        total += size
+        entry = by_type.setdefault(cls.__name__, [0, 0])
+        entry[0] += 1
+        entry[1] += size
+        by_attribute[label] = by_attribute.get(label, 0) + size
+
+        # Los hijos que quedan fuera de la muestra se dan por contados: si se
+        # alcanzan por otro camino no se extrapolan dos veces
+        if sample and len(children) > sample:
+            weight = weight * len(children) / sample
+            children = _sample(list(children), sample, rng, seen)
+        if named and sample and len(named) > sample:
+            weight = weight * len(named) / sample
+            chosen = _sample([value for _, value in named], sample, rng, seen)
+            chosen = set(map(id, chosen))
+            named = [(name, value) for name, value in named if id(value) in chosen]
 
-    obj_id = id(obj)
-    if obj_id in seen:
+        for child in children:
+            if type(child) in _ATOMIC_TYPES:
+                # Los escalares se cuentan en el lugar, sin pasar por la pila
+                if id(child) not in seen:
+                    mark(id(child))
+                    child_size = getsizeof(child) * weight
+                    total += child_size
+                    entry = by_type.setdefault(type(child).__name__, [0, 0])
+                    entry[0] += 1
+                    entry[1] += child_size
+                    by_attribute[label] = by_attribute.get(label, 0) + child_size
+            else:
+                push((child, weight, label))
+        for name, value in named:
+            push((value, weight, f'{cls.__name__}.{name}'))
+
+    return total, by_type, by_attribute
+
+def _sample(children:list, sample:int, rng:random.Random, seen:set) -> list:
+    # Elige sample hijos al azar y da por contado todo lo que alcanzan los demas,
+    # asi lo que tambien cuelga de otro contenedor muestreado no se extrapola dos
+    # veces. Los elegidos quedan fuera de seen para recorrerlos despues
+    chosen = rng.sample(children, sample)
+    chosen_ids = set(map(id, chosen)) - seen
+    seen.update(chosen_ids)
+    _traverse(children, seen, measure=False)
+    seen.difference_update(chosen_ids)
+    return chosen
+
+def _is_buffer(obj) -> bool:
+    if np is not None and isinstance(obj, np.ndarray) or type(obj) is memoryview:
+        return True
+    try:
+        memoryview(obj).release()
+    except TypeError:
+        return False
+    return True
+
+def _buffer_size(obj, owners:list) -> int:
+    # Datos de un buffer que getsizeof no incluye: las vistas de numpy y los
+    # memoryview agregan su dueño a owners; otros objetos con protocolo de
+    # buffer (mmap, array.array) suman lo que falte hasta nbytes
+    if np is not None and isinstance(obj, np.ndarray):
+        if obj.base is not None:
+            owners.append(obj.base)
+        return 0
+    if type(obj) is memoryview:
+        owners.append(obj.obj)
         return 0
-    seen.add(obj_id)
+    try:
+        with memoryview(obj) as view:
+            return max(view.nbytes - getsizeof(obj), 0)
+    except (TypeError, ValueError):
+        return 0
+
+def _slot_names(cls) -> Tuple[str]:
+    # Atributos guardados en __slots__ a lo largo de toda la jerarquia
+    names = _SLOT_NAMES.get(cls)
+    if names is None:
+        names = []
+        for klass in cls.__mro__:
+            slots = klass.__dict__.get('__slots__', ())
+            for name in (slots,) if isinstance(slots, str) else slots:
+                if name not in ('__dict__', '__weakref__') and name not in names:
+                    names.append(name)
+        names = _SLOT_NAMES[cls] = tuple(names)
+    return names
+
+# ============================================================
+# ALMACEN DE ASSETS (direccionado por contenido)
+# ============================================================
 
-    size = getsizeof(obj)
+class AssetStore:
+    # Guarda cada payload intrinseco (modelo, textura, sonidos, comportamientos)
+    # una sola vez, con el hash de su contenido como llave. Las listas se guardan
+    # como tuplas y cada GameObjectType cuenta como una referencia: cuando se
+    # libera el ultimo tipo que usa un payload, el payload sale del almacen
 
-    if isinstance(obj, dict):
-        for k, v in obj.items():
-            size += deep_sizeof(k, seen)
-            size += deep_sizeof(v, seen)
-    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
-        for item in obj:
-            size += deep_sizeof(item, seen)
-    elif hasattr(obj, "__dict__"):
-        size += deep_sizeof(obj.__dict__, seen)
-    return size
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._payloads = {}
+
+    def put(self, payload) -> Tuple[bytes, object]:
+        # (digest, payload compartido) con el mismo contenido que payload
+        payload = self._freeze(payload)
+        digest = blake2b(
+            f'{type(payload).__name__}:{payload!r}'.encode(), digest_size=16
+        ).digest()
+        with self._lock:
+            entry = self._payloads.get(digest)
+            if entry is None:
+                entry = self._payloads[digest] = [payload, 0]
+            entry[1] += 1
+            return digest, entry[0]
+
+    def release(self, digests:Tuple[bytes]):
+        with self._lock:
+            for digest in digests:
+                entry = self._payloads[digest]
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._payloads[digest]
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = list(self._payloads.values())
+        return {
+            'assets'     : len(entries),
+            'references' : sum(refs for _, refs in entries),
+            'bytes'      : deep_sizeof([payload for payload, _ in entries]),
+        }
+
+    @classmethod
+    def _freeze(cls, payload):
+        if isinstance(payload, str):
+            return sys.intern(payload)
+        if isinstance(payload, (list, tuple)):
+            return tuple(cls._freeze(item) for item in payload)
+        if isinstance(payload, dict):
+            return tuple((cls._freeze(k), cls._freeze(v)) for k, v in payload.items())
+        return payload
+
+ASSET_STORE = AssetStore()
 
 APP_DEBUG_RENDER = False
 
 class GameObjectType(object):
+    __slots__ = ('_name', '_model_3d', '_texture', '_sounds', '_behaviors', '__weakref__')
 
     def __init__(self, name:str, model_3d:str, texture:str, sounds:List[str], behaviors:Union[dict, list]):
+        # Los payloads intrinsecos salen de ASSET_STORE: tipos con el mismo
+        # contenido comparten el mismo objeto (sonidos y comportamientos como tuplas)
+        digests, payloads = zip(*map(ASSET_STORE.put, (model_3d, texture, sounds, behaviors)))
+        finalize(self, ASSET_STORE.release, digests)
         self._name = name
-        self._model_3d, self._texture = model_3d, texture
-        self._sounds, self._behaviors = sounds, behaviors
+        self._model_3d, self._texture, self._sounds, self._behaviors = payloads
 
     def render(self, position:Tuple[int], rotation:Tuple[int], scale:Tuple[int]):
-        render = '\n'.join([
+        if APP_DEBUG_RENDER:
+            print(self._render_text(position, rotation, scale))
+
+    def render_batch(self, positions, rotations, scales):
+        # Una sola llamada por flyweight con el estado extrinseco de todas sus
+        # instancias (listas de tuplas o arrays de numpy), como un draw instanciado
+        if APP_DEBUG_RENDER:
+            for position, rotation, scale in zip(positions, rotations, scales):
+                print(self._render_text(position, rotation, scale))
+
+    def _render_text(self, position:Tuple[int], rotation:Tuple[int], scale:Tuple[int]) -> str:
+        return '\n'.join([
             f'Renderizando objeto: {self._name}',
             f'position x: {position[0]}, y: {position[1]}',
             f'rotation rx: {rotation[0]}, ry: {rotation[1]} rz: {rotation[2]}',
@@ -47,8 +316,6 @@ class GameObjectType(object):
             f'modelado 3d: {self._model_3d}',
             f'texture: {self._texture}'
         ])
-        if APP_DEBUG_RENDER:
-            print(render)
 
     def play_sound(self, sound_id:str):
         assert sound_id in self._sounds, (
@@ -60,15 +327,70 @@ class GameObjectType(object):
         return f'Objeto: {self._name}'
 
 class GameObjectTypeFactory:
-    _game_types = {}
+    # Los flyweights viven mientras algun objeto (o el LRU de tipos calientes) los
+    # referencie; al quedar sin referencias se liberan modelo y textura y se
+    # avisa a los hooks registrados con on_unload
+    _game_types = WeakValueDictionary()
+    _hot_types  = OrderedDict()
+    hot_size = 32
+    _lock = threading.RLock()
+    _unload_hooks = []
 
     @classmethod
     def get_game_object(cls, name:str, *args, **kwargs):
-        if name not in cls._game_types:
-            cls._game_types[name] = GameObjectType(name, *args, **kwargs)
-        return cls._game_types[name]
+        with cls._lock:
+            obj_type = cls._game_types.get(name)
+            if obj_type is None:
+                obj_type = cls._game_types[name] = GameObjectType(name, *args, **kwargs)
+                finalize(obj_type, cls._unloaded, name)
+            cls._touch(name, obj_type)
+            return obj_type
+
+    @classmethod
+    def configure(cls, hot_size:int):
+        with cls._lock:
+            cls.hot_size = hot_size
+            cls._trim()
+
+    @classmethod
+    def unload(cls, name:str):
+        # Suelta la referencia fuerte del LRU; el tipo se libera cuando ningun
+        # objeto lo use
+        with cls._lock:
+            cls._hot_types.pop(name, None)
+
+    @classmethod
+    def on_unload(cls, hook):
+        with cls._lock:
+            cls._unload_hooks.append(hook)
+
+    @classmethod
+    def loaded_types(cls) -> dict:
+        with cls._lock:
+            return dict(cls._game_types.items())
+
+    @classmethod
+    def _touch(cls, name:str, obj_type:GameObjectType):
+        cls._hot_types[name] = obj_type
+        cls._hot_types.move_to_end(name)
+        cls._trim()
+
+    @classmethod
+    def _trim(cls):
+        while len(cls._hot_types) > cls.hot_size:
+            cls._hot_types.popitem(last=False)
+
+    @classmethod
+    def _unloaded(cls, name:str):
+        # Lo llama el recolector, en cualquier hilo: los hooks corren fuera del lock
+        with cls._lock:
+            hooks = list(cls._unload_hooks)
+        for hook in hooks:
+            hook(name)
 
 class GameObject:
+    __slots__ = ('_position', '_scale', '_rotation', '_state', '_obj_type')
+
     def __init__(self,
         position:Tuple[int],
         scale:Tuple[int],
@@ -90,18 +412,307 @@ class GameObject:
     def play_sound(self, sound_id:str):
         self._obj_type.play_sound(sound_id)
 
+# ============================================================
+# INDICE ESPACIAL (grilla hash y k-d tree)
+# ============================================================
+
+class GridIndex:
+    # Grilla uniforme hasheada: cada celda de cell_size de lado es una llave en un
+    # dict, asi solo ocupan memoria las celdas con objetos. Insertar, quitar y
+    # mover son O(1); conviene cuando muchos objetos se mueven en cada frame
+
+    def __init__(self, cell_size:float=64):
+        self.cell_size = cell_size
+        self._cells = {}
+        self._entries = {}
+        self._low = self._high = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def insert(self, key, position:Tuple[int]):
+        if key in self._entries:
+            self.remove(key)
+        cell = self._cell(position)
+        self._cells.setdefault(cell, {})[key] = position
+        self._entries[key] = (position, cell)
+        if self._low is None:
+            self._low, self._high = cell, cell
+        else:
+            self._low  = tuple(map(min, self._low, cell))
+            self._high = tuple(map(max, self._high, cell))
+
+    def remove(self, key):
+        _, cell = self._entries.pop(key)
+        bucket = self._cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self._cells[cell]
+
+    def move(self, key, position:Tuple[int]):
+        _, cell = self._entries[key]
+        new_cell = self._cell(position)
+        if new_cell == cell:
+            self._cells[cell][key] = position
+            self._entries[key] = (position, cell)
+        else:
+            self.insert(key, position)
+
+    def query_box(self, low:Tuple[int], high:Tuple[int]) -> list:
+        return [
+            key for key, position in self._scan(low, high)
+            if all(map(le, low, position)) and all(map(le, position, high))
+        ]
+
+    def query_radius(self, center:Tuple[int], radius:float) -> list:
+        low  = tuple(c - radius for c in center)
+        high = tuple(c + radius for c in center)
+        return [key for key, position in self._scan(low, high) if dist(center, position) <= radius]
+
+    def nearest(self, point:Tuple[int], k:int=1) -> list:
+        # Recorre anillos de celdas alrededor de point hasta que el k-esimo
+        # candidato este mas cerca que el borde del bloque ya visitado
+        if not self._entries:
+            return []
+        size = self.cell_size
+        origin = self._cell(point)
+        reach = max(
+            max(abs(c - a), abs(c - b)) for c, a, b in zip(origin, self._low, self._high)
+        )
+        found = []
+        for ring in range(reach + 1):
+            for cell in self._ring(origin, ring):
+                bucket = self._cells.get(cell)
+                if bucket:
+                    found.extend((dist(point, position), key) for key, position in bucket.items())
+            if len(found) >= k:
+                found = nsmallest(k, found, key=lambda item: item[0])
+                border = min(
+                    min(p - (c - ring) * size, (c + ring + 1) * size - p) for p, c in zip(point, origin)
+                )
+                if found[-1][0] <= border:
+                    break
+        return [key for _, key in nsmallest(k, found, key=lambda item: item[0])]
+
+    def _scan(self, low:Tuple[int], high:Tuple[int]):
+        # (llave, posicion) de las celdas que tocan la caja
+        low_cell, high_cell = self._cell(low), self._cell(high)
+        span = 1
+        for a, b in zip(low_cell, high_cell):
+            span *= b - a + 1
+        if span > len(self._cells):
+            # La caja cubre mas celdas de las que existen: se recorren las ocupadas
+            buckets = [
+                bucket for cell, bucket in self._cells.items()
+                if all(a <= c <= b for a, c, b in zip(low_cell, cell, high_cell))
+            ]
+        else:
+            buckets = [bucket for bucket in map(self._cells.get, self._cells_between(low_cell, high_cell)) if bucket]
+        for bucket in buckets:
+            yield from bucket.items()
+
+    def _cell(self, position:Tuple[int]) -> Tuple[int]:
+        size = self.cell_size
+        return tuple(int(p // size) for p in position)
+
+    @staticmethod
+    def _cells_between(low:Tuple[int], high:Tuple[int]):
+        cells = [()]
+        for a, b in zip(low, high):
+            cells = [cell + (c,) for cell in cells for c in range(a, b + 1)]
+        return cells
+
+    @classmethod
+    def _ring(cls, origin:Tuple[int], ring:int):
+        # Celdas a distancia de Chebyshev exactamente ring de origin
+        if ring == 0:
+            return [origin]
+        low  = tuple(c - ring for c in origin)
+        high = tuple(c + ring for c in origin)
+        return [
+            cell for cell in cls._cells_between(low, high)
+            if max(abs(c - o) for c, o in zip(cell, origin)) == ring
+        ]
+
+class KDTreeIndex:
+    # k-d tree implicito sobre una lista: el nodo de [lo, hi) es el elemento del
+    # medio y divide por el eje depth % dims. Los cambios no reconstruyen el arbol:
+    # las altas y los movimientos van a un buffer que se recorre lineal, y las bajas
+    # invalidan la entrada del arbol por numero de serie. Cuando el buffer supera
+    # max_pending o las entradas muertas superan rebuild_ratio del total, la
+    # siguiente consulta reconstruye el arbol (una carga masiva se indexa una sola
+    # vez). Mejor que la grilla con objetos muy agrupados y pocos movimientos por frame
+
+    def __init__(self, max_pending:int=512, rebuild_ratio:float=0.125):
+        self.max_pending, self.rebuild_ratio = max_pending, rebuild_ratio
+        self._entries = {}
+        self._tree = []
+        self._pending = {}
+        self._dead = 0
+        self._serial = 0
+        self._dims = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def insert(self, key, position:Tuple[int]):
+        if key in self._entries:
+            self.remove(key)
+        self._serial += 1
+        self._entries[key] = (position, self._serial)
+        self._pending[key] = position
+        self._dims = self._dims or len(position)
+
+    def remove(self, key):
+        self._entries.pop(key)
+        if self._pending.pop(key, None) is None:
+            self._dead += 1
+
+    def move(self, key, position:Tuple[int]):
+        self.insert(key, position)
+
+    def rebuild(self):
+        items = [(position, key, serial) for key, (position, serial) in self._entries.items()]
+        self._build(items, 0, len(items), 0)
+        self._tree = items
+        self._pending.clear()
+        self._dead = 0
+
+    def query_box(self, low:Tuple[int], high:Tuple[int]) -> list:
+        self._maybe_rebuild()
+        result = [
+            key for key, position in self._pending.items()
+            if all(a <= p <= b for a, p, b in zip(low, position, high))
+        ]
+        entries, tree, dims = self._entries, self._tree, self._dims
+        stack = [(0, len(tree), 0)]
+        while stack:
+            lo, hi, axis = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            position, key, serial = tree[mid]
+            split, next_axis = position[axis], (axis + 1) % dims
+            if low[axis] <= split:
+                stack.append((lo, mid, next_axis))
+                if split <= high[axis]:
+                    stack.append((mid + 1, hi, next_axis))
+                    if all(map(le, low, position)) and all(map(le, position, high)):
+                        entry = entries.get(key)
+                        if entry is not None and entry[1] == serial:
+                            result.append(key)
+            else:
+                stack.append((mid + 1, hi, next_axis))
+        return result
+
+    def query_radius(self, center:Tuple[int], radius:float) -> list:
+        low  = tuple(c - radius for c in center)
+        high = tuple(c + radius for c in center)
+        entries = self._entries
+        return [key for key in self.query_box(low, high) if dist(center, entries[key][0]) <= radius]
+
+    def nearest(self, point:Tuple[int], k:int=1) -> list:
+        self._maybe_rebuild()
+        found = nsmallest(
+            k, ((dist(point, position), key) for key, position in self._pending.items()), key=lambda item: item[0]
+        )
+        entries, tree, dims = self._entries, self._tree, self._dims
+        stack = [(0, len(tree), 0, 0.0)]
+        while stack:
+            lo, hi, axis, gap = stack.pop()
+            if lo >= hi or (len(found) == k and gap > found[-1][0]):
+                continue
+            mid = (lo + hi) // 2
+            position, key, serial = tree[mid]
+            entry = entries.get(key)
+            if entry is not None and entry[1] == serial:
+                distance = dist(point, position)
+                if len(found) < k or distance < found[-1][0]:
+                    found.append((distance, key))
+                    found.sort(key=lambda item: item[0])
+                    del found[k:]
+            delta = point[axis] - position[axis]
+            near, far = ((lo, mid), (mid + 1, hi)) if delta < 0 else ((mid + 1, hi), (lo, mid))
+            next_axis = (axis + 1) % dims
+            # El lado cercano se apila al final para visitarlo primero
+            stack.append((*far, next_axis, max(gap, abs(delta))))
+            stack.append((*near, next_axis, gap))
+        return [key for _, key in found]
+
+    def _maybe_rebuild(self):
+        if len(self._pending) > self.max_pending or self._dead > self.rebuild_ratio * len(self._entries):
+            self.rebuild()
+
+    def _build(self, items:list, lo:int, hi:int, axis:int):
+        stack = [(lo, hi, axis)]
+        while stack:
+            lo, hi, axis = stack.pop()
+            if hi - lo <= 1:
+                continue
+            items[lo:hi] = sorted(items[lo:hi], key=lambda item: item[0][axis])
+            mid = (lo + hi) // 2
+            next_axis = (axis + 1) % self._dims
+            stack.append((lo, mid, next_axis))
+            stack.append((mid + 1, hi, next_axis))
+
 class GameWorld:
 
-    def __init__(self, x:int, y:int, z:int):
+    def __init__(self, x:int, y:int, z:int, spatial_index:Union[GridIndex, KDTreeIndex]=None):
         self._x, self._y, self._z = x,y,z
         self.objects = []
+        self.spatial_index = spatial_index
+        # Por flyweight: (objetos, posiciones, rotaciones, escalas) listos para
+        # render_batch, y la fila de cada objeto dentro de su lote
+        self._batches = {}
+        self._batch_rows = {}
 
     def add_object(self, obj:GameObject):
         self.objects.append(obj)
+        batch = self._batches.setdefault(obj._obj_type, ([], [], [], []))
+        self._batch_rows[obj] = len(batch[0])
+        for column, value in zip(batch, (obj, obj._position, obj._rotation, obj._scale)):
+            column.append(value)
+        if self.spatial_index is not None:
+            self.spatial_index.insert(obj, obj._position)
+
+    def remove_object(self, obj:GameObject):
+        self.objects.remove(obj)
+        # La ultima fila del lote ocupa el lugar de la que se quita
+        batch, row = self._batches[obj._obj_type], self._batch_rows.pop(obj)
+        for column in batch:
+            column[row] = column[-1]
+            column.pop()
+        if row < len(batch[0]):
+            self._batch_rows[batch[0][row]] = row
+        elif not batch[0]:
+            del self._batches[obj._obj_type]
+        if self.spatial_index is not None:
+            self.spatial_index.remove(obj)
+
+    def move_object(self, obj:GameObject, position:Tuple[int]):
+        obj._position = position
+        self._batches[obj._obj_type][1][self._batch_rows[obj]] = position
+        if self.spatial_index is not None:
+            self.spatial_index.move(obj, position)
+
+    def objects_in_box(self, low:Tuple[int], high:Tuple[int]) -> List[GameObject]:
+        return self.spatial_index.query_box(low, high)
+
+    def objects_in_radius(self, center:Tuple[int], radius:float) -> List[GameObject]:
+        return self.spatial_index.query_radius(center, radius)
+
+    def nearest_objects(self, point:Tuple[int], k:int=1) -> List[GameObject]:
+        return self.spatial_index.nearest(point, k)
 
     def render_all(self):
-        for obj in self.objects:
-            obj.render()
+        for obj_type, (_, positions, rotations, scales) in self._batches.items():
+            obj_type.render_batch(positions, rotations, scales)
 
     def count_unique_flyweights(self):
         return len(GameObjectTypeFactory._game_types)
@@ -109,6 +720,446 @@ class GameWorld:
     def count_total_objects(self):
         return len(self.objects)
 
+# ============================================================
+# MUNDO COLUMNAR (struct of arrays, requiere numpy)
+# ============================================================
+
+class GameObjectView(GameObject):
+    # Vista liviana de la fila index de un ColumnarGameWorld: mismos atributos y
+    # metodos que GameObject, pero leidos de las columnas del mundo
+
+    __slots__ = ('_world', '_index')
+
+    def __init__(self, world:'ColumnarGameWorld', index:int):
+        self._world, self._index = world, index
+
+    @property
+    def _position(self):
+        return tuple(self._world.positions[self._index].tolist())
+
+    @property
+    def _scale(self):
+        return tuple(self._world.scales[self._index].tolist())
+
+    @property
+    def _rotation(self):
+        return tuple(self._world.rotations[self._index].tolist())
+
+    @property
+    def _state(self):
+        return self._world.state_names[self._world.states[self._index]]
+
+    @property
+    def _obj_type(self):
+        return self._world.types[self._world.type_codes[self._index]]
+
+class ColumnarObjects:
+    # Secuencia de solo lectura que reemplaza a GameWorld.objects
+
+    def __init__(self, world:'ColumnarGameWorld'):
+        self._world = world
+
+    def __len__(self):
+        return self._world.size
+
+    def __getitem__(self, index:int) -> GameObjectView:
+        if index < 0:
+            index += self._world.size
+        if not 0 <= index < self._world.size:
+            raise IndexError(index)
+        return GameObjectView(self._world, index)
+
+    def __iter__(self):
+        for index in range(self._world.size):
+            yield GameObjectView(self._world, index)
+
+class ColumnarGameWorld:
+    # Mismo API que GameWorld, pero el estado extrinseco vive en arrays contiguos:
+    # posicion (n, 2), escala y rotacion (n, 3) en int32, el estado como codigo
+    # uint8 y el flyweight como indice uint16 en la tabla types, que guarda los
+    # GameObjectType entregados por GameObjectTypeFactory. Unos 35 bytes por objeto
+    # contra varios cientos de un GameObject con sus tuplas y su __dict__
+
+    def __init__(self, x:int, y:int, z:int, capacity:int=1024, spatial_index=None):
+        if np is None:
+            raise ImportError('ColumnarGameWorld requiere numpy')
+        self._x, self._y, self._z = x, y, z
+        self.size = 0
+        self.positions = np.zeros((capacity, 2), dtype=np.int32)
+        self.scales    = np.zeros((capacity, 3), dtype=np.int32)
+        self.rotations = np.zeros((capacity, 3), dtype=np.int32)
+        self.states     = np.zeros(capacity, dtype=np.uint8)
+        self.type_codes = np.zeros(capacity, dtype=np.uint16)
+        self.state_names, self._state_codes = [], {}
+        self.types, self._type_codes = [], {}
+        self.objects = ColumnarObjects(self)
+        # Las llaves del indice espacial son los numeros de fila
+        self.spatial_index = spatial_index
+
+    @classmethod
+    def from_columns(cls,
+        x:int, y:int, z:int,
+        positions, scales, rotations, states, type_codes,
+        state_names:List[str],
+        types:List[GameObjectType],
+        spatial_index=None
+    ) -> 'ColumnarGameWorld':
+        # Usa los arrays tal cual, sin copiarlos (por ejemplo vistas sobre un
+        # mmap); si son de solo lectura, add los copia al crecer
+        world = cls(x, y, z, capacity=1)
+        world.size = len(states)
+        world.positions, world.scales, world.rotations = positions, scales, rotations
+        world.states, world.type_codes = states, type_codes
+        world.state_names = list(state_names)
+        world._state_codes = {state: code for code, state in enumerate(world.state_names)}
+        world.types = list(types)
+        world._type_codes = {id(obj_type): code for code, obj_type in enumerate(world.types)}
+        world.spatial_index = spatial_index
+        if spatial_index is not None:
+            for index, position in enumerate(positions.tolist()):
+                spatial_index.insert(index, tuple(position))
+        return world
+
+    def add_object(self, obj:GameObject) -> int:
+        return self.add(obj._position, obj._scale, obj._rotation, obj._state, obj._obj_type)
+
+    def add(self,
+        position:Tuple[int],
+        scale:Tuple[int],
+        rotation:Tuple[int],
+        state:str,
+        obj_type:GameObjectType
+    ) -> int:
+        self._reserve(self.size + 1)
+        index = self.size
+        self.positions[index] = position
+        self.scales[index] = scale
+        self.rotations[index] = rotation
+        self.states[index] = self.state_code(state)
+        self.type_codes[index] = self.type_code(obj_type)
+        self.size += 1
+        if self.spatial_index is not None:
+            self.spatial_index.insert(index, tuple(self.positions[index].tolist()))
+        return index
+
+    def add_many(self, positions, scales, rotations, states, type_codes) -> range:
+        # Carga masiva: states y type_codes ya son codigos (ver state_code/type_code)
+        count = len(positions)
+        self._reserve(self.size + count)
+        rows = slice(self.size, self.size + count)
+        self.positions[rows] = positions
+        self.scales[rows] = scales
+        self.rotations[rows] = rotations
+        self.states[rows] = states
+        self.type_codes[rows] = type_codes
+        self.size += count
+        if self.spatial_index is not None:
+            for index, position in enumerate(self.positions[rows].tolist(), rows.start):
+                self.spatial_index.insert(index, tuple(position))
+        return range(rows.start, rows.stop)
+
+    def state_code(self, state:str) -> int:
+        code = self._state_codes.get(state)
+        if code is None:
+            if len(self.state_names) > np.iinfo(np.uint8).max:
+                raise ValueError('Demasiados estados distintos para un codigo uint8')
+            code = self._state_codes[state] = len(self.state_names)
+            self.state_names.append(state)
+        return code
+
+    def type_code(self, obj_type:GameObjectType) -> int:
+        code = self._type_codes.get(id(obj_type))
+        if code is None:
+            if len(self.types) > np.iinfo(np.uint16).max:
+                raise ValueError('Demasiados flyweights distintos para un indice uint16')
+            code = self._type_codes[id(obj_type)] = len(self.types)
+            self.types.append(obj_type)
+        return code
+
+    def render_all(self):
+        # Ordena las filas por flyweight y pasa a cada uno sus tramos de columnas
+        type_codes = self.type_codes[:self.size]
+        order = np.argsort(type_codes, kind='stable')
+        bounds = np.cumsum(np.bincount(type_codes, minlength=len(self.types)))
+        start = 0
+        for obj_type, stop in zip(self.types, bounds.tolist()):
+            if stop > start:
+                rows = order[start:stop]
+                obj_type.render_batch(self.positions[rows], self.rotations[rows], self.scales[rows])
+            start = stop
+
+    def count_unique_flyweights(self):
+        return len(GameObjectTypeFactory._game_types)
+
+    def count_total_objects(self):
+        return self.size
+
+    # Operaciones vectorizadas sobre todas las filas (o las de mask)
+
+    def translate(self, delta:Tuple[int], mask=None):
+        positions = self.positions[:self.size]
+        if mask is None:
+            positions += np.asarray(delta, dtype=np.int32)
+        else:
+            positions[mask] += np.asarray(delta, dtype=np.int32)
+        if self.spatial_index is not None:
+            rows = range(self.size) if mask is None else np.flatnonzero(mask).tolist()
+            for index in rows:
+                self.spatial_index.move(index, tuple(positions[index].tolist()))
+
+    def move(self, index:int, position:Tuple[int]):
+        self.positions[index] = position
+        if self.spatial_index is not None:
+            self.spatial_index.move(index, tuple(self.positions[index].tolist()))
+
+    def objects_in_box(self, low:Tuple[int], high:Tuple[int]) -> List[GameObjectView]:
+        return [GameObjectView(self, index) for index in self.spatial_index.query_box(low, high)]
+
+    def objects_in_radius(self, center:Tuple[int], radius:float) -> List[GameObjectView]:
+        return [GameObjectView(self, index) for index in self.spatial_index.query_radius(center, radius)]
+
+    def nearest_objects(self, point:Tuple[int], k:int=1) -> List[GameObjectView]:
+        return [GameObjectView(self, index) for index in self.spatial_index.nearest(point, k)]
+
+    def select(self, state:str=None, obj_type:GameObjectType=None):
+        # Indices de las filas con ese estado y/o ese flyweight
+        mask = np.ones(self.size, dtype=bool)
+        if state is not None:
+            mask &= self.states[:self.size] == self._state_codes.get(state, -1)
+        if obj_type is not None:
+            mask &= self.type_codes[:self.size] == self._type_codes.get(id(obj_type), -1)
+        return np.flatnonzero(mask)
+
+    def memory_bytes(self) -> int:
+        columns = (self.positions, self.scales, self.rotations, self.states, self.type_codes)
+        return sum(column[:self.size].nbytes for column in columns)
+
+    def _reserve(self, needed:int):
+        capacity = len(self.states) or 1
+        if needed <= len(self.states):
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ('positions', 'scales', 'rotations', 'states', 'type_codes'):
+            column = getattr(self, name)
+            grown = np.zeros((capacity, *column.shape[1:]), dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+
+# ============================================================
+# SNAPSHOT EN DISCO (mmap, requiere numpy)
+# ============================================================
+
+# Cabecera: magia, version, bytes de la tabla de flyweights, cantidad de
+# registros y dimensiones del mundo. Sigue la tabla en JSON (estados y tipos),
+# relleno hasta SNAPSHOT_ALIGN y los registros de ancho fijo
+SNAPSHOT_MAGIC   = b'FLYW'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER  = struct.Struct('<4sHHIQiii')
+SNAPSHOT_ALIGN   = 64
+
+def _snapshot_record():
+    return np.dtype([
+        ('position', '<i4', (2,)),
+        ('scale',    '<i4', (3,)),
+        ('rotation', '<i4', (3,)),
+        ('state',    'u1'),
+        ('type',     '<u2'),
+    ])
+
+def save_snapshot(world:Union[GameWorld, 'ColumnarGameWorld'], path:str):
+    # Escribe el mundo de una sola vez: la tabla de flyweights y un array de
+    # registros armado columna por columna
+    if np is None:
+        raise ImportError('save_snapshot requiere numpy')
+    if not isinstance(world, ColumnarGameWorld):
+        columnar = ColumnarGameWorld(world._x, world._y, world._z, capacity=max(len(world.objects), 1))
+        for obj in world.objects:
+            columnar.add_object(obj)
+        world = columnar
+
+    records = np.empty(world.size, dtype=_snapshot_record())
+    records['position'] = world.positions[:world.size]
+    records['scale']    = world.scales[:world.size]
+    records['rotation'] = world.rotations[:world.size]
+    records['state']    = world.states[:world.size]
+    records['type']     = world.type_codes[:world.size]
+    table = json.dumps({
+        'states' : world.state_names,
+        'types'  : [
+            {
+                'name'      : obj_type._name,
+                'model_3d'  : obj_type._model_3d,
+                'texture'   : obj_type._texture,
+                'sounds'    : obj_type._sounds,
+                'behaviors' : obj_type._behaviors,
+            }
+            for obj_type in world.types
+        ],
+    }).encode()
+
+    with open(path, 'wb') as file:
+        file.write(SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, len(table), world.size, world._x, world._y, world._z
+        ))
+        file.write(table)
+        file.write(b'\0' * (-(SNAPSHOT_HEADER.size + len(table)) % SNAPSHOT_ALIGN))
+        file.write(records.tobytes())
+
+def load_snapshot(path:str, writable:bool=False, spatial_index=None) -> 'ColumnarGameWorld':
+    # Mapea el archivo y devuelve un ColumnarGameWorld cuyas columnas son vistas
+    # sobre el mmap: no se parsea ningun registro y el sistema operativo trae las
+    # paginas a medida que se leen. Sin writable el mapeo es de solo lectura y
+    # varios procesos comparten las mismas paginas; con writable es copy-on-write
+    # y los cambios no llegan al archivo. Los flyweights salen de
+    # GameObjectTypeFactory, asi que son los mismos objetos que usa el proceso
+    if np is None:
+        raise ImportError('load_snapshot requiere numpy')
+    with open(path, 'rb') as file:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY if writable else mmap.ACCESS_READ)
+
+    magic, version, _, table_size, count, x, y, z = SNAPSHOT_HEADER.unpack_from(mapping)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError(f'{path} no es un snapshot de GameWorld (version {SNAPSHOT_VERSION})')
+    table = json.loads(mapping[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + table_size])
+    offset = SNAPSHOT_HEADER.size + table_size
+    offset += -offset % SNAPSHOT_ALIGN
+    records = np.frombuffer(mapping, dtype=_snapshot_record(), count=count, offset=offset)
+
+    types = [
+        GameObjectTypeFactory.get_game_object(
+            data['name'], data['model_3d'], data['texture'], data['sounds'], data['behaviors']
+        )
+        for data in table['types']
+    ]
+    return ColumnarGameWorld.from_columns(
+        x, y, z,
+        records['position'], records['scale'], records['rotation'], records['state'], records['type'],
+        table['states'], types, spatial_index=spatial_index,
+    )
+
+# ============================================================
+# GENERACION PROCEDURAL EN PARALELO (requiere numpy)
+# ============================================================
+
+class WorldSpec:
+    # count objetos que usan uno de los flyweights names (todos con el mismo
+    # modelo, textura, sonidos y comportamientos) y uno de los estados states
+
+    def __init__(self,
+        count:int,
+        names:List[str],
+        model_3d:str,
+        texture:str,
+        sounds:List[str],
+        behaviors:Union[dict, list],
+        states:List[str]
+    ):
+        self.count, self.names, self.states = count, list(names), list(states)
+        self.model_3d, self.texture = model_3d, texture
+        self.sounds, self.behaviors = sounds, behaviors
+
+def _generate_chunk(task:tuple) -> tuple:
+    # Corre en el pool: solo devuelve columnas e indices locales (nombre y estado
+    # dentro de su WorldSpec), nunca flyweights
+    x, y, z, count, names, states, seed, key = task
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=key))
+    limits = np.array([x, y, z], dtype=np.int64) + 1
+    return (
+        rng.integers(0, limits[:2], size=(count, 2), dtype=np.int32),
+        rng.integers(0, limits, size=(count, 3), dtype=np.int32),
+        rng.integers(0, limits, size=(count, 3), dtype=np.int32),
+        rng.integers(0, states, size=count, dtype=np.uint8),
+        rng.integers(0, names, size=count, dtype=np.uint16),
+    )
+
+def generate_world(
+    x:int, y:int, z:int,
+    specs:List[WorldSpec],
+    seed:int=0,
+    chunk_size:int=16384,
+    processes:int=None,
+    spatial_index=None
+) -> 'ColumnarGameWorld':
+    # Parte cada WorldSpec en tramos de chunk_size objetos y los genera con
+    # generadores de numpy vectorizados, en un pool de processes procesos (0 o 1
+    # genera en este proceso). La semilla de cada tramo sale de (seed, spec,
+    # tramo), asi el mundo es el mismo con cualquier cantidad de procesos. Los
+    # flyweights se piden a GameObjectTypeFactory en este proceso al unir los
+    # tramos, en orden, y no cruzan entre procesos
+    if np is None:
+        raise ImportError('generate_world requiere numpy')
+    tasks, owners = [], []
+    for spec_index, spec in enumerate(specs):
+        for chunk, start in enumerate(range(0, spec.count, chunk_size)):
+            count = min(chunk_size, spec.count - start)
+            tasks.append((x, y, z, count, len(spec.names), len(spec.states), seed, (spec_index, chunk)))
+            owners.append(spec)
+
+    world = ColumnarGameWorld(x, y, z, capacity=max(sum(spec.count for spec in specs), 1))
+    codes = {}
+    for spec in specs:
+        types = [
+            GameObjectTypeFactory.get_game_object(name, spec.model_3d, spec.texture, spec.sounds, spec.behaviors)
+            for name in spec.names
+        ]
+        codes[id(spec)] = (
+            np.array([world.state_code(state) for state in spec.states], dtype=np.uint8),
+            np.array([world.type_code(obj_type) for obj_type in types], dtype=np.uint16),
+        )
+
+    if processes is not None and processes <= 1:
+        _merge_chunks(world, owners, map(_generate_chunk, tasks), codes)
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            _merge_chunks(world, owners, executor.map(_generate_chunk, tasks), codes)
+
+    if spatial_index is not None:
+        world.spatial_index = spatial_index
+        for index, position in enumerate(world.positions[:world.size].tolist()):
+            spatial_index.insert(index, tuple(position))
+    return world
+
+def _merge_chunks(world:'ColumnarGameWorld', owners:List[WorldSpec], chunks, codes:dict):
+    for spec, (positions, scales, rotations, states, names) in zip(owners, chunks):
+        state_codes, type_codes = codes[id(spec)]
+        world.add_many(positions, scales, rotations, state_codes[states], type_codes[names])
+
+# ============================================================
+# REPORTE DE MEMORIA
+# ============================================================
+
+def memory_report(world:Union[GameWorld, ColumnarGameWorld]) -> dict:
+    # Bytes por objeto y por tipo, y lo que ahorran el flyweight (cada objeto
+    # no carga su copia del tipo) y ASSET_STORE (payloads iguales una sola vez)
+    counts = Counter(obj._obj_type for obj in world.objects)
+    types = list(counts)
+    if isinstance(world, ColumnarGameWorld):
+        extrinsic = world.memory_bytes()
+    else:
+        extrinsic = deep_sizeof(world.objects, set(map(id, types)))
+    standalone = {obj_type: deep_sizeof(obj_type) for obj_type in types}
+    intrinsic = deep_sizeof(types) - getsizeof(types)
+    total = sum(counts.values()) or 1
+    without_flyweight = extrinsic + sum(standalone[obj_type] * count for obj_type, count in counts.items())
+    return {
+        'objects'          : sum(counts.values()),
+        'types'            : len(types),
+        'extrinsic_bytes'  : extrinsic,
+        'intrinsic_bytes'  : intrinsic,
+        'bytes_per_object' : (extrinsic + intrinsic) / total,
+        'saved_per_object' : (without_flyweight - extrinsic - intrinsic) / total,
+        'saved_by_dedup'   : sum(standalone.values()) - intrinsic,
+        'per_type'         : {
+            obj_type._name: {
+                'objects' : count,
+                'bytes'   : standalone[obj_type],
+                'saved'   : standalone[obj_type] * (count - 1),
+            }
+            for obj_type, count in counts.items()
+        },
+    }
 
 if __name__ == '__main__':
     simulate_model_and_texture_bytes = [
@@ -161,11 +1212,38 @@ if __name__ == '__main__':
     # APP_DEBUG_RENDER = True
     game_world.render_all()
 
-    total_mem_objects = deep_sizeof(game_world)
-    total_mem_flyweights = deep_sizeof(GameObjectTypeFactory._game_types)
+    report = memory_report(game_world)
+    total_mem_objects, total_mem_flyweights = report['extrinsic_bytes'], report['intrinsic_bytes']
 
     print(f'Objetos totales en el mundo: {game_world.count_total_objects()}')
     print(f'Flyweights únicos: {game_world.count_unique_flyweights()}')
     print(f"Memoria objetos extrínsecos: {total_mem_objects/1024/1024:.2f} MB")
     print(f"Memoria flyweights        : {total_mem_flyweights/1024/1024:.2f} MB")
-    print(f"TOTAL: {(total_mem_objects+total_mem_flyweights)/1024/1024:.2f} MB")
\ No newline at end of file
+    print(f"TOTAL: {(total_mem_objects+total_mem_flyweights)/1024/1024:.2f} MB")
+    print(f"Bytes por objeto          : {report['bytes_per_object']:.1f}")
+    print(f"Ahorro por objeto         : {report['saved_per_object']:.1f} bytes")
+    print(f"Ahorro por assets repetidos: {report['saved_by_dedup']} bytes")
+    for name, data in report['per_type'].items():
+        print(f"  {name:<10} objetos: {data['objects']:>6}  bytes: {data['bytes']:>6}  ahorro: {data['saved']} bytes")
+
+    breakdown = memory_breakdown(game_world, sample=1000)
+    print(f"Desglose por atributo (muestreo, total ~{breakdown['total']/1024/1024:.2f} MB):")
+    for label, size in list(breakdown['by_attribute'].items())[:6]:
+        print(f"  {label or '<raiz>':<24} {size/1024/1024:.2f} MB")
+
+    specs = [
+        WorldSpec(
+            nro,
+            npc_names if name == 'NPC' else [name],
+            base_model_3d * simulate_model_and_texture_bytes[base_model_3d],
+            base_texture * simulate_model_and_texture_bytes[base_texture],
+            sounds,
+            behaviors,
+            state_npc if name == 'NPC' else states_npc_not_living,
+        )
+        for nro, name, base_model_3d, base_texture, sounds, behaviors in base_data_objests
+    ]
+    started = time.perf_counter()
+    columnar_world = generate_world(game_world._x, game_world._y, game_world._z, specs, seed=1)
+    print(f"Mundo columnar en paralelo: {columnar_world.count_total_objects()} objetos en "
+          f"{time.perf_counter() - started:.2f}s, {columnar_world.memory_bytes()/1024/1024:.2f} MB")
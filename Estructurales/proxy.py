@@ -1,187 +1,2540 @@
+import asyncio
+import bisect
+import contextvars
+import hashlib
+import inspect
+import itertools
+import json
+import mmap
+import os
+import pickle
+import queue
 import random
+import sqlite3
+import struct
+import threading
 import time
 
 from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError, wait as wait_futures
+from contextlib import contextmanager
+from functools import partial
+from sys import getsizeof
 from unittest import TestCase
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_MISSING = object()
+
 class RateLimitError(Exception):
     pass
 
-class Service(ABC):
+class CircuitOpenError(Exception):
+    pass
+
+class BulkheadFullError(Exception):
+    pass
+
+class DeadlineExceededError(Exception):
+    pass
+
+class PoolExhaustedError(Exception):
+    pass
+
+class Service(ABC):
+
+    @abstractmethod
+    def generate(self, *args, **kwargs):
+        pass
+
+class PaymentService(Service):
+
+    def generate(self, user:str, amount:float):
+        print('Generando pago...')
+        time.sleep(random.uniform(0.5, 1.5))
+        return self._process(user, amount)
+
+    def generate_batch(self, calls:list):
+        print(f'Generando {len(calls)} pagos en lote...')
+        time.sleep(random.uniform(0.5, 1.5))
+        return [self._process(*args, **kwargs) for args, kwargs in calls]
+
+    def _process(self, user:str, amount:float):
+        result = bool(random.randint(0,1))
+        if result:
+            return result, f'Pago para {user} con el monto {amount} procesado éxitosamente'
+        return result, 'El pago no pudo ser procesado'
+
+class ReportService(Service):
+
+    def generate(self, report_id:int):
+        print(f'Generando reporte {report_id}...')
+        time.sleep(random.uniform(1.0, 2.0))
+        return self._process(report_id)
+
+    def generate_batch(self, calls:list):
+        print(f'Generando {len(calls)} reportes en lote...')
+        time.sleep(random.uniform(1.0, 2.0))
+        return [self._process(*args, **kwargs) for args, kwargs in calls]
+
+    def _process(self, report_id:int):
+        result = report_id < 5
+        if result:
+            return 'Reporte generado éxitosamente'
+        return 'El reporte no pudo ser generado correctamente'
+
+class ImageService(Service):
+
+    def generate(self, image:bytes):
+        print('Procesando imagen...')
+        time.sleep(random.uniform(2.0, 3.0))
+        result = bool(random.randint(0,1))
+        if result:
+            return 'Imagen procesado correctamente'
+        return 'La imagen se encuentra corrupta o dañana, no pudo ser procesada'
+
+###
+
+class LoggingProxy(Service):
+
+    def __init__(self, service:Service):
+        self._real_service = service
+        self.logs = []
+
+    def generate(self, *args, **kwargs):
+        self._record(args, kwargs)
+        return self._real_service.generate(*args, **kwargs)
+
+    def _record(self, args, kwargs):
+        self.logs.append(
+            f'time: {time.strftime("%Y-%m-%dT%H:%M:%S")} \
+            service: {self._real_service.__class__.__name__} \
+            args: {args} \
+            kwargs: {kwargs}'
+        )
+
+    # def drop_and_wirte_logs(self):
+    #     while self.logs:
+    #         print(self.logs.pop(0))
+
+class RingBuffer:
+    # Muchos escritores sin lock: next() sobre itertools.count es atomico bajo
+    # el GIL, asi que cada escritor obtiene su propia posicion. Los lectores
+    # (drain) se serializan con un lock. Si los escritores dan la vuelta al
+    # lector se pierden los registros mas viejos y se cuentan en dropped
+
+    def __init__(self, capacity:int=4096):
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self._sequence = itertools.count()
+        self._read = 0
+        self._read_lock = threading.Lock()
+        self.dropped = 0
+
+    def put(self, record):
+        sequence = next(self._sequence)
+        self._slots[sequence % self.capacity] = (sequence, record)
+
+    def drain(self, limit:int=None) -> list:
+        records = []
+        with self._read_lock:
+            while limit is None or len(records) < limit:
+                slot = self._slots[self._read % self.capacity]
+                if slot is None or slot[0] < self._read:
+                    break
+                if slot[0] > self._read:
+                    oldest = slot[0] - self.capacity + 1
+                    self.dropped += oldest - self._read
+                    self._read = oldest
+                    continue
+                records.append(slot[1])
+                self._read += 1
+        return records
+
+class BufferedLoggingProxy(Service):
+    # Registra tuplas compactas (monotonic, servicio, llave canonica de args,
+    # latencia, resultado) en un RingBuffer; el digest estable de la llave, el
+    # formateo y la escritura al sink ocurren en un hilo de fondo cada
+    # flush_interval segundos
+
+    def __init__(self,
+        service:Service,
+        sink=None,
+        capacity:int=4096,
+        flush_interval:float=1.0,
+        key_builder=None
+    ):
+        self._real_service = service
+        self._service_id = service.__class__.__name__
+        self._key_builder = key_builder or CacheKeyBuilder()
+        self.buffer = RingBuffer(capacity)
+        self._sink = sink
+        self._flush_interval = flush_interval
+        self._clock_offset = time.time() - time.monotonic()
+        self._stopped = threading.Event()
+        self._flusher = None
+        if sink is not None:
+            self._flusher = threading.Thread(target=self._run, daemon=True)
+            self._flusher.start()
+
+    def generate(self, *args, **kwargs):
+        started = time.monotonic()
+        try:
+            result = self._real_service.generate(*args, **kwargs)
+        except Exception as error:
+            self._record(started, args, kwargs, error.__class__.__name__)
+            raise error
+        self._record(started, args, kwargs, 'ok')
+        return result
+
+    def _record(self, started:float, args, kwargs, outcome:str):
+        self.buffer.put((
+            started, self._service_id, self._key_builder(args, kwargs),
+            time.monotonic() - started, outcome
+        ))
+
+    @staticmethod
+    def arg_digest(key:tuple) -> str:
+        # blake2b no usa semilla por proceso (hash() si), asi que el mismo
+        # argumento da el mismo digest en todos los workers y reinicios
+        return hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()
+
+    def flush(self) -> int:
+        records = self.buffer.drain()
+        if records and self._sink is not None:
+            lines = ''.join(self.format(record) for record in records)
+            if isinstance(self._sink, str):
+                with open(self._sink, 'a', encoding='utf-8') as sink:
+                    sink.write(lines)
+            else:
+                self._sink.write(lines)
+        return len(records)
+
+    def format(self, record:tuple) -> str:
+        started, service_id, key, latency, outcome = record
+        stamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started + self._clock_offset))
+        return f'time: {stamp} service: {service_id} args: {self.arg_digest(key)} latency: {latency*1000:.2f}ms outcome: {outcome}\n'
+
+    def close(self):
+        self._stopped.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.wait(self._flush_interval):
+            self.flush()
+
+def estimate_size(obj) -> int:
+    stack, seen, size = [obj], set(), 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+    return size
+
+class LRUPolicy:
+
+    def __init__(self):
+        self._order = OrderedDict()
+
+    def on_insert(self, key):
+        self._order[key] = None
+
+    def on_access(self, key):
+        self._order.move_to_end(key)
+
+    def on_remove(self, key):
+        self._order.pop(key, None)
+
+    def victim(self):
+        return next(iter(self._order))
+
+class LFUPolicy:
+
+    def __init__(self):
+        self._freq = {}
+        self._buckets = defaultdict(OrderedDict)
+        self._min_freq = 0
+
+    def on_insert(self, key):
+        self._freq[key] = 1
+        self._buckets[1][key] = None
+        self._min_freq = 1
+
+    def on_access(self, key):
+        freq = self._freq[key]
+        self._unlink(key, freq)
+        if self._min_freq == freq and freq not in self._buckets:
+            self._min_freq = freq + 1
+        self._freq[key] = freq + 1
+        self._buckets[freq + 1][key] = None
+
+    def on_remove(self, key):
+        freq = self._freq.pop(key, None)
+        if freq is not None:
+            self._unlink(key, freq)
+
+    def victim(self):
+        if self._min_freq not in self._buckets:
+            self._min_freq = min(self._buckets)
+        return next(iter(self._buckets[self._min_freq]))
+
+    def _unlink(self, key, freq):
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+
+EVICTION_POLICIES = {
+    'LRU' : LRUPolicy,
+    'LFU' : LFUPolicy,
+}
+
+class BoundedCache:
+    # Cada entrada es [valor, bytes, expira_en, accesos]. Pasado expira_en la
+    # entrada esta vencida, pero se conserva grace segundos mas para que
+    # get_entry pueda devolverla como valor viejo (stale-while-revalidate)
+
+    def __init__(self,
+        max_entries:int=None,
+        max_bytes:int=None,
+        ttl:float=None,
+        policy:str='LRU',
+        sizeof=estimate_size,
+        grace:float=0
+    ):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f'Politica de desalojo desconocida: {policy}')
+        self.max_entries, self.max_bytes, self.ttl, self.grace = max_entries, max_bytes, ttl, grace
+        self._sizeof = sizeof
+        self._policy = EVICTION_POLICIES[policy]()
+        self._entries = {}
+        self._lock = threading.RLock()
+        self.current_bytes = 0
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[2] is not None and entry[2] <= time.monotonic():
+                self._expire(key, entry)
+                self.misses += 1
+                return default
+            self._policy.on_access(key)
+            entry[3] += 1
+            self.hits += 1
+            return entry[0]
+
+    def get_entry(self, key):
+        # (valor, expira_en, accesos) aunque este vencida dentro de grace; None si no esta
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] + self.grace <= time.monotonic():
+                self._expire(key, entry)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._policy.on_access(key)
+            entry[3] += 1
+            self.hits += 1
+            return entry[0], entry[2], entry[3]
+
+    def set(self, key, value, ttl:float=_MISSING) -> bool:
+        ttl = self.ttl if ttl is _MISSING else ttl
+        size = self._sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return False
+
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = [value, size, expires_at, 0]
+            self._policy.on_insert(key)
+            self.current_bytes += size
+            self._evict()
+        return True
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            self._remove(key)
+            return entry[0]
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self) -> dict:
+        return {
+            'entries'     : len(self._entries),
+            'bytes'       : self.current_bytes,
+            'hits'        : self.hits,
+            'misses'      : self.misses,
+            'evictions'   : self.evictions,
+            'expirations' : self.expirations,
+        }
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (entry[2] is None or entry[2] > time.monotonic())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _expire(self, key, entry:list):
+        # Vencida sin margen: se borra; dentro de grace queda para get_entry
+        if entry[2] + self.grace <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._policy.on_remove(key)
+        self.current_bytes -= entry[1]
+
+    def _evict(self):
+        while self._entries and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries) or
+            (self.max_bytes is not None and self.current_bytes > self.max_bytes)
+        ):
+            self._remove(self._policy.victim())
+            self.evictions += 1
+
+SERIALIZERS = {
+    'pickle' : (partial(pickle.dumps, protocol=pickle.HIGHEST_PROTOCOL), pickle.loads),
+    'json'   : (lambda value: json.dumps(value).encode(), lambda data: json.loads(data)),
+}
+
+class SqliteCacheStore:
+    # Segundo nivel de cache en disco: sobrevive reinicios y lo pueden compartir
+    # varios procesos del mismo host (sqlite en modo WAL). Con write_behind las
+    # escrituras se encolan y un hilo las persiste por lotes. expires_at usa el
+    # reloj de pared para que la expiracion valga entre procesos y reinicios
+
+    def __init__(self,
+        path:str,
+        serializer='pickle',
+        write_behind:bool=False,
+        max_bytes:int=None,
+        compact_every:int=100
+    ):
+        self._dumps, self._loads = SERIALIZERS[serializer] if isinstance(serializer, str) else serializer
+        self.max_bytes, self._compact_every = max_bytes, compact_every
+        self._writes_since_compact = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'key BLOB PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL, '
+            'expires_at REAL)'
+        )
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(cache)')}
+        if 'expires_at' not in columns:
+            self._conn.execute('ALTER TABLE cache ADD COLUMN expires_at REAL')
+        self.hits = self.misses = self.compactions = self.expirations = self.write_errors = 0
+
+        self._queue = None
+        if write_behind:
+            self._queue = queue.Queue()
+            self._writer = threading.Thread(target=self._drain, daemon=True)
+            self._writer.start()
+
+    def get(self, key, default=None):
+        return self.get_with_ttl(key, default)[0]
+
+    def get_with_ttl(self, key, default=None) -> tuple:
+        # Devuelve (valor, segundos de vida restantes o None si no expira)
+        db_key = self._key(key)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, expires_at FROM cache WHERE key = ?', (db_key,)
+            ).fetchone()
+            if row is not None and row[1] is not None and row[1] <= now:
+                self._conn.execute('DELETE FROM cache WHERE key = ?', (db_key,))
+                self.expirations += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return default, None
+            self._conn.execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, db_key))
+        self.hits += 1
+        return self._loads(row[0]), (row[1] - now if row[1] is not None else None)
+
+    def set(self, key, value, ttl:float=None):
+        data = self._dumps(value)
+        now = time.time()
+        row = (self._key(key), data, len(data), now, now + ttl if ttl is not None else None)
+        if self._queue is not None:
+            self._queue.put(row)
+        else:
+            self._write([row])
+
+    def flush(self):
+        if self._queue is not None:
+            self._queue.join()
+
+    def compact(self):
+        with self._lock, self._transaction():
+            self.expirations += self._conn.execute(
+                'DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),)
+            ).rowcount
+            if self.max_bytes is None:
+                return
+            total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for key, size in self._conn.execute(
+                'SELECT key, size FROM cache ORDER BY accessed'
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+                total -= size
+            self.compactions += 1
+
+    def close(self):
+        if self._queue is not None:
+            self._queue.put(None)
+            self._writer.join()
+        self._conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+
+    def _write(self, rows:list):
+        with self._lock, self._transaction():
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, size, accessed, expires_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+        self._writes_since_compact += len(rows)
+        if self._writes_since_compact >= self._compact_every:
+            self._writes_since_compact = 0
+            self.compact()
+
+    def _drain(self):
+        while True:
+            rows = [self._queue.get()]
+            while len(rows) < 256:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            pending = [row for row in rows if row is not None]
+            try:
+                if pending:
+                    self._write_with_retry(pending)
+            finally:
+                for _ in rows:
+                    self._queue.task_done()
+            if len(pending) != len(rows):
+                return
+
+    def _write_with_retry(self, rows:list, attempts:int=3):
+        # El hilo de escritura no puede morir: si la base sigue bloqueada tras
+        # varios intentos el lote se descarta y se contabiliza
+        for attempt in range(attempts):
+            try:
+                self._write(rows)
+                return
+            except sqlite3.Error as error:
+                last_error = error
+                time.sleep(0.05 * 2 ** attempt)
+        self.write_errors += len(rows)
+        print(f'SqliteCacheStore: se descartan {len(rows)} escrituras ({last_error})')
+
+    @staticmethod
+    def _key(key) -> bytes:
+        return hashlib.blake2b(pickle.dumps(key, protocol=4), digest_size=16).digest()
+
+class CacheKeyBuilder:
+    # Llave canonica (args, kwargs): kwargs ordenados por nombre, contenedores
+    # etiquetados con su tipo y los buffers (o textos) grandes reemplazados por su
+    # digest, para no retener payloads de varios MB como llaves
+
+    def __init__(self,
+        digest='blake2b',
+        digest_size:int=16,
+        min_digest_bytes:int=1024,
+        memoize:int=0,
+        memoize_max_bytes:int=64 * 1024 * 1024
+    ):
+        if callable(digest):
+            self._digest, self._digest_name = digest, getattr(digest, '__name__', 'digest')
+        else:
+            self._digest = partial(self._hashlib_digest, digest, digest_size)
+            self._digest_name = digest
+        self.min_digest_bytes = min_digest_bytes
+        self._memo_size, self._memo_max_bytes = memoize, memoize_max_bytes
+        self._memo = OrderedDict()
+        self._memo_bytes = 0
+        self._memo_lock = threading.Lock()
+
+    def __call__(self, args:tuple, kwargs:dict) -> tuple:
+        parts = tuple([self._part(value) for value in args])
+        if not kwargs:
+            return (parts, ())
+        return (parts, tuple([(name, self._part(kwargs[name])) for name in sorted(kwargs)]))
+
+    def _part(self, value):
+        # Toda tupla de la llave es una etiqueta: ('tuple', ...) no choca con
+        # ('list', ...) ni con el digest de un texto o un buffer del mismo contenido
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            if memoryview(value).nbytes < self.min_digest_bytes:
+                return value if isinstance(value, bytes) else bytes(value)
+            return self._buffer_digest(value)
+        if isinstance(value, str):
+            if len(value) < self.min_digest_bytes:
+                return value
+            return ('str', self._digest_name, self._digest(value.encode()))
+        if isinstance(value, tuple):
+            return ('tuple', tuple([self._part(item) for item in value]))
+        if isinstance(value, list):
+            return ('list', tuple([self._part(item) for item in value]))
+        if isinstance(value, dict):
+            items = sorted(value.items(), key=lambda item: repr(item[0]))
+            return ('dict', tuple([(name, self._part(item)) for name, item in items]))
+        return value
+
+    def _buffer_digest(self, value):
+        # Solo los bytes son inmutables, asi que solo ellos se memorizan por identidad.
+        # La memoria guarda una referencia fuerte a cada buffer (si no, su id podria
+        # reutilizarse), por eso se acota tambien por bytes retenidos
+        size = len(value) if isinstance(value, bytes) else 0
+        if not self._memo_size or not size or size > self._memo_max_bytes:
+            return ('bytes', self._digest_name, self._digest(value))
+
+        with self._memo_lock:
+            cached = self._memo.get(id(value))
+            if cached is not None and cached[0] is value:
+                self._memo.move_to_end(id(value))
+                return cached[1]
+
+        part = ('bytes', self._digest_name, self._digest(value))
+        with self._memo_lock:
+            if id(value) not in self._memo:
+                self._memo[id(value)] = (value, part)
+                self._memo_bytes += size
+            while len(self._memo) > self._memo_size or self._memo_bytes > self._memo_max_bytes:
+                evicted, _ = self._memo.popitem(last=False)[1]
+                self._memo_bytes -= len(evicted)
+        return part
+
+    @staticmethod
+    def _hashlib_digest(name:str, digest_size:int, data) -> bytes:
+        if name in ('blake2b', 'blake2s'):
+            return hashlib.new(name, data, digest_size=digest_size).digest()
+        return hashlib.new(name, data).digest()
+
+class SingleFlight:
+    # Las llamadas concurrentes con la misma llave comparten un solo Future, tanto
+    # desde hilos (do) como desde corrutinas (do_async)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.coalesced = 0
+
+    def _join(self, key):
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._flights[key] = Future()
+            return future, True
+
+    def _finish(self, key, future:Future, result=None, error:BaseException=None):
+        with self._lock:
+            del self._flights[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn, *args, **kwargs):
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as error:
+            self._finish(key, future, error=error)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as error:
+            self._finish(key, future, error=error)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+class CoalescingProxy(Service):
+
+    def __init__(self, service:Service, key_builder:CacheKeyBuilder=None):
+        self._real_service = service
+        self._key_builder = key_builder or CacheKeyBuilder()
+        self._flights = SingleFlight()
+
+    def generate(self, *args, **kwargs):
+        key = self._key_builder(args, kwargs)
+        return self._flights.do(key, self._real_service.generate, *args, **kwargs)
+
+    @property
+    def coalesced_calls(self):
+        return self._flights.coalesced
+
+# Pool compartido y acotado para los refrescos en segundo plano: aunque muchas
+# llaves venzan a la vez, el servicio real nunca recibe mas de 4 refrescos juntos
+REFRESH_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix='cache-refresh')
+
+class CachingProxy(Service):
+    # Con stale_while_revalidate=s una entrada vencida hace menos de s segundos se
+    # devuelve igual y se refresca en segundo plano. Con refresh_ahead=s una llave
+    # con al menos refresh_min_hits accesos se refresca cuando le quedan menos de s
+    # segundos. Los refrescos de cada llave no se duplican y, si ya hay
+    # refresh_max_pending en espera, se descartan (el valor viejo sigue sirviendo)
+
+    def __init__(self, service:Service, **kwargs):
+        self._real_service = service
+        self.stale_while_revalidate = kwargs.pop('stale_while_revalidate', None)
+        self.refresh_ahead          = kwargs.pop('refresh_ahead', None)
+        self.refresh_min_hits       = kwargs.pop('refresh_min_hits', 2)
+        self._cache = BoundedCache(
+            max_entries = kwargs.pop('max_entries', None),
+            max_bytes   = kwargs.pop('max_bytes', None),
+            ttl         = kwargs.pop('ttl', None),
+            policy      = kwargs.pop('policy', 'LRU'),
+            grace       = self.stale_while_revalidate or 0,
+        )
+        self._disk = kwargs.pop('disk_cache', None)
+        self._key_builder = kwargs.pop('key_builder', None) or CacheKeyBuilder()
+        self._flights = SingleFlight() if kwargs.pop('coalesce', False) else None
+        self._refresh_executor = kwargs.pop('refresh_executor', None) or REFRESH_EXECUTOR
+        self._refresh_slots = threading.BoundedSemaphore(kwargs.pop('refresh_max_pending', 16))
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self.real_call_count = self.cache_hits = self.disk_hits = 0
+        self.stale_hits = self.refreshes = self.refresh_errors = 0
+
+    def generate(self, *args, **kwargs):
+        return self._generate_keyed(self._key_builder(args, kwargs), args, kwargs)
+
+    def _generate_keyed(self, cache_args, args, kwargs):
+        result = self._lookup(cache_args, args, kwargs)
+        if result is not _MISSING:
+            return result
+
+        if self._flights is None:
+            return self._load(cache_args, args, kwargs)
+        return self._flights.do(cache_args, self._lead, cache_args, args, kwargs)
+
+    def _lead(self, cache_args, args, kwargs):
+        # El lider anterior pudo terminar entre nuestro _lookup y _join: se vuelve a
+        # mirar la cache antes de ir al servicio real
+        result = self._lookup(cache_args, args, kwargs)
+        if result is not _MISSING:
+            return result
+        return self._load(cache_args, args, kwargs)
+
+    def _lookup(self, cache_args, args=(), kwargs=None):
+        entry = self._cache.get_entry(cache_args)
+        if entry is not None:
+            result, expires_at, hits = entry
+            self.cache_hits += 1
+            if expires_at is not None:
+                remaining = expires_at - time.monotonic()
+                if remaining <= 0:
+                    self.stale_hits += 1
+                    self._schedule_refresh(cache_args, args, kwargs or {})
+                elif self.refresh_ahead is not None and remaining <= self.refresh_ahead and (
+                    hits >= self.refresh_min_hits
+                ):
+                    self._schedule_refresh(cache_args, args, kwargs or {})
+            return result
+        result = _MISSING
+        if self._disk is not None:
+            result, remaining = self._disk.get_with_ttl(cache_args, _MISSING)
+            if result is not _MISSING:
+                ttl = self._cache.ttl if remaining is None else min(remaining, self._cache.ttl or remaining)
+                self._cache.set(cache_args, result, ttl)
+                self.disk_hits += 1
+        return result
+
+    def _store(self, cache_args, result):
+        self._cache.set(cache_args, result)
+        if self._disk is not None:
+            self._disk.set(cache_args, result, self._cache.ttl)
+        self.real_call_count += 1
+
+    def _load(self, cache_args, args, kwargs):
+        print(
+            f'Service: {self._real_service.__class__.__name__} args: {cache_args} saving in cache...'
+        )
+        result = self._real_service.generate(*args, **kwargs)
+        self._store(cache_args, result)
+        return result
+
+    def _schedule_refresh(self, cache_args, args, kwargs):
+        with self._refresh_lock:
+            if cache_args in self._refreshing or not self._refresh_slots.acquire(blocking=False):
+                return
+            self._refreshing.add(cache_args)
+        self._start_refresh(cache_args, args, kwargs)
+
+    def _start_refresh(self, cache_args, args, kwargs):
+        self._refresh_executor.submit(self._refresh, cache_args, args, kwargs)
+
+    def _refresh(self, cache_args, args, kwargs):
+        try:
+            self._store(cache_args, self._real_service.generate(*args, **kwargs))
+            self.refreshes += 1
+        except Exception:
+            self.refresh_errors += 1
+        finally:
+            self._refresh_done(cache_args)
+
+    def _refresh_done(self, cache_args):
+        with self._refresh_lock:
+            self._refreshing.discard(cache_args)
+        self._refresh_slots.release()
+
+    @property
+    def coalesced_calls(self):
+        return self._flights.coalesced if self._flights is not None else 0
+
+    @property
+    def cache_misses(self):
+        return self._cache.misses
+
+    @property
+    def evictions(self):
+        return self._cache.evictions
+
+    def stats(self) -> dict:
+        return dict(
+            self._cache.stats(),
+            cache_hits=self.cache_hits,
+            real_call_count=self.real_call_count,
+            coalesced_calls=self.coalesced_calls,
+            disk_hits=self.disk_hits,
+            stale_hits=self.stale_hits,
+            refreshes=self.refreshes
+        )
+
+class LazyLoadingProxy(Service):
+    def __init__(self, service_cls:type[Service]):
+        self._service_cls = service_cls
+        self._real_service = None
+        self._init_lock = threading.Lock()
+        # Solo se expone generate_batch si el servicio real lo tiene, para que
+        # BatchingProxy pueda detectarlo con getattr
+        if hasattr(service_cls, 'generate_batch'):
+            self.generate_batch = self._generate_batch
+
+    def generate(self, *args, **kwargs):
+        return self._get_service().generate(*args, **kwargs)
+
+    def _generate_batch(self, calls:list):
+        return self._get_service().generate_batch(calls)
+
+    def _get_service(self):
+        # Doble verificacion: sin lock en el camino comun, y con lock para que
+        # varias primeras llamadas concurrentes creen una sola instancia
+        service = self._real_service
+        if service is None:
+            with self._init_lock:
+                if self._real_service is None:
+                    print(f'Generando por unica vez instancia de {self._service_cls.__name__}')
+                    self._real_service = self._create()
+                service = self._real_service
+        return service
+
+    def _create(self):
+        return self._service_cls()
+
+class PooledLazyProxy(Service):
+    # Pool de instancias del servicio para backends con estado o no thread-safe:
+    # cada llamada toma una instancia en exclusiva (checkout) y la devuelve al
+    # terminar (checkin). Se crean a demanda hasta max_size; con prewarm un hilo
+    # crea min_size al arrancar. Las instancias ociosas mas de idle_timeout se
+    # descartan, sin bajar de min_size
+
+    def __init__(self, service_cls:type[Service], **kwargs):
+        self._service_cls = service_cls
+        self.min_size         = kwargs.pop('min_size', 0)
+        self.max_size         = kwargs.pop('max_size', 4)
+        self.idle_timeout     = kwargs.pop('idle_timeout', 60)
+        self.checkout_timeout = kwargs.pop('checkout_timeout', None)
+        self._idle = deque()
+        self._condition = threading.Condition()
+        self._created = self._in_use = 0
+        self.evicted = self.waits = 0
+        if hasattr(service_cls, 'generate_batch'):
+            self.generate_batch = self._generate_batch
+        self._prewarmer = None
+        if kwargs.pop('prewarm', False):
+            self._prewarmer = threading.Thread(target=self._prewarm, daemon=True)
+            self._prewarmer.start()
+
+    def generate(self, *args, **kwargs):
+        with self.lease() as service:
+            return service.generate(*args, **kwargs)
+
+    def _generate_batch(self, calls:list):
+        with self.lease() as service:
+            return service.generate_batch(calls)
+
+    @contextmanager
+    def lease(self, timeout:float=_MISSING):
+        service = self.checkout(timeout)
+        try:
+            yield service
+        finally:
+            self.checkin(service)
+
+    def checkout(self, timeout:float=_MISSING):
+        timeout = self.checkout_timeout if timeout is _MISSING else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                self._evict_idle()
+                if self._idle:
+                    # LIFO: la instancia mas reciente es la que tiene caches mas calientes
+                    self._in_use += 1
+                    return self._idle.pop()[0]
+                if self._created < self.max_size:
+                    self._created += 1
+                    self._in_use += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise PoolExhaustedError(
+                        f'Las {self.max_size} instancias de {self._service_cls.__name__} estan ocupadas'
+                    )
+                self.waits += 1
+                self._condition.wait(remaining)
+        return self._new_instance(in_use=True)
+
+    def checkin(self, service):
+        with self._condition:
+            self._in_use -= 1
+            self._idle.append((service, time.monotonic()))
+            self._condition.notify()
+
+    def metrics(self) -> dict:
+        with self._condition:
+            return {
+                'created' : self._created,
+                'idle'    : len(self._idle),
+                'in_use'  : self._in_use,
+                'evicted' : self.evicted,
+                'waits'   : self.waits,
+            }
+
+    def close(self):
+        with self._condition:
+            self._created -= len(self._idle)
+            self._idle.clear()
+
+    def _new_instance(self, in_use:bool):
+        # Se construye fuera del lock: si falla se devuelve el cupo reservado
+        try:
+            print(f'Generando instancia de {self._service_cls.__name__} para el pool')
+            return self._service_cls()
+        except BaseException:
+            with self._condition:
+                self._created -= 1
+                self._in_use -= in_use
+                self._condition.notify()
+            raise
+
+    def _prewarm(self):
+        while True:
+            with self._condition:
+                if self._created >= self.min_size:
+                    return
+                self._created += 1
+            service = self._new_instance(in_use=False)
+            with self._condition:
+                self._idle.append((service, time.monotonic()))
+                self._condition.notify()
+
+    def _evict_idle(self):
+        # Las mas viejas estan a la izquierda; se llama con el lock tomado
+        horizon = time.monotonic() - self.idle_timeout
+        while self._idle and self._created > self.min_size and self._idle[0][1] < horizon:
+            self._idle.popleft()
+            self._created -= 1
+            self.evicted += 1
+
+class StateStore(ABC):
+    # update(key, fn) aplica fn(estado) -> (nuevo_estado, resultado) de forma atomica.
+    # Los estados son tuplas de numeros; None significa "sin estado"
+
+    @abstractmethod
+    def update(self, key, fn):
+        pass
+
+    def get(self, key):
+        return self.update(key, lambda state: (state, state))
+
+class LocalStateStore(StateStore):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def update(self, key, fn):
+        with self._lock:
+            state, result = fn(self._states.get(key))
+            if state is None:
+                self._states.pop(key, None)
+            else:
+                self._states[key] = state
+            return result
+
+# Por defecto los limitadores comparten este store, asi el limite es por llamador
+# (usuario, rol) y no por instancia de proxy, aunque el proxy se cree por request
+SHARED_STATE_STORE = LocalStateStore()
+
+class MmapStateStore(StateStore):
+    # Tabla hash de registros de ancho fijo sobre un archivo mapeado en memoria.
+    # Varios procesos del mismo host que abren el mismo archivo comparten el
+    # estado; flock serializa las actualizaciones entre procesos. Un estado None
+    # deja una lapida reutilizable y, con la tabla llena, se desaloja el registro
+    # que lleva mas tiempo sin actualizarse
+
+    TOMBSTONE = 0xFFFFFFFFFFFFFFFF
+
+    def __init__(self, path:str, slots:int=1024, width:int=8):
+        self.width = width
+        self._record = struct.Struct(f'<QId{width}d')
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        with self._file_lock():
+            size = max(os.fstat(self._fd).st_size, self._record.size * slots)
+            os.ftruncate(self._fd, size)
+        self.slots = size // self._record.size
+        self._map = mmap.mmap(self._fd, self.slots * self._record.size)
+        self.evictions = 0
+
+    def update(self, key, fn):
+        key_hash = self._hash(key)
+        with self._lock, self._file_lock():
+            offset, found = self._find(key_hash)
+            state = None
+            if found:
+                _, length, _, *values = self._record.unpack_from(self._map, offset)
+                state = tuple(values[:length]) if length else None
+            new_state, result = fn(state)
+            if new_state is None:
+                if found:
+                    self._record.pack_into(self._map, offset, self.TOMBSTONE, 0, 0.0, *(0.0,) * self.width)
+                return result
+            if len(new_state) > self.width:
+                raise ValueError(f'El estado de {key} excede el ancho del registro ({self.width})')
+            padding = (0.0,) * (self.width - len(new_state))
+            self._record.pack_into(
+                self._map, offset, key_hash, len(new_state), time.time(), *new_state, *padding
+            )
+            return result
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    def _find(self, key_hash:int) -> tuple:
+        # Devuelve (offset, encontrado). Sondeo lineal hasta la llave o un hueco
+        # vacio; las lapidas se saltan pero la primera se reutiliza para insertar
+        size = self._record.size
+        start = key_hash % self.slots
+        reusable = stalest = None
+        stalest_time = float('inf')
+        for probe in range(self.slots):
+            offset = ((start + probe) % self.slots) * size
+            stored_hash, _, updated_at = struct.unpack_from('<QId', self._map, offset)
+            if stored_hash == key_hash:
+                return offset, True
+            if stored_hash == 0:
+                return (offset if reusable is None else reusable), False
+            if stored_hash == self.TOMBSTONE:
+                if reusable is None:
+                    reusable = offset
+            elif updated_at < stalest_time:
+                stalest, stalest_time = offset, updated_at
+        if reusable is not None:
+            return reusable, False
+        self.evictions += 1
+        return stalest, False
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @classmethod
+    def _hash(cls, key) -> int:
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=8).digest()
+        return min(int.from_bytes(digest, 'little') or 1, cls.TOMBSTONE - 1)
+
+# Pool compartido donde se ejecutan los lotes; el hilo que junta llamadas de
+# cada BatchingProxy solo arma lotes y nunca espera al servicio
+BATCH_EXECUTOR = ThreadPoolExecutor(thread_name_prefix='batching')
+
+class BatchingProxy(Service):
+    # Junta llamadas concurrentes hasta max_batch o max_wait segundos y las envia en
+    # una sola llamada a generate_batch([(args, kwargs), ...]) del servicio; cada
+    # llamador recibe su propio resultado (o excepcion, si el lote devuelve una).
+    # Si el servicio no tiene generate_batch se llama a generate directamente.
+    # El hilo colector termina tras idle_timeout segundos sin llamadas
+
+    def __init__(self,
+        service:Service,
+        max_batch:int=16,
+        max_wait:float=0.01,
+        idle_timeout:float=1.0,
+        executor:Executor=None
+    ):
+        self._real_service = service
+        self._generate_batch = getattr(service, 'generate_batch', None)
+        self.max_batch, self.max_wait, self.idle_timeout = max_batch, max_wait, idle_timeout
+        self._executor = executor or BATCH_EXECUTOR
+        self._pending = []
+        self._condition = threading.Condition()
+        self._flusher = None
+        self._closing = False
+        self.batch_count = self.batched_calls = 0
+
+    def generate(self, *args, **kwargs):
+        if self._generate_batch is None:
+            return self._real_service.generate(*args, **kwargs)
+
+        future = Future()
+        with self._condition:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, daemon=True)
+                self._flusher.start()
+            self._pending.append((args, kwargs, future))
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._condition.notify()
+        return future.result()
+
+    def close(self):
+        # Despacha lo pendiente y detiene el hilo colector; una llamada posterior
+        # lo vuelve a iniciar
+        with self._condition:
+            self._closing = True
+            flusher = self._flusher
+            self._condition.notify_all()
+        if flusher is not None:
+            flusher.join()
+        with self._condition:
+            self._closing = False
+
+    def _run(self):
+        while True:
+            with self._condition:
+                idle_deadline = time.monotonic() + self.idle_timeout
+                while not self._pending and not self._closing:
+                    remaining = idle_deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if not self._pending:
+                    self._flusher = None
+                    return
+                deadline = time.monotonic() + self.max_wait
+                while len(self._pending) < self.max_batch and not self._closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+                self.batch_count += 1
+                self.batched_calls += len(batch)
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch:list):
+        try:
+            results = self._generate_batch([(args, kwargs) for args, kwargs, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f'generate_batch devolvio {len(results)} resultados para {len(batch)} llamadas'
+                )
+        except Exception as error:
+            for _, _, future in batch:
+                future.set_exception(error)
+            return
+
+        for (_, _, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+class RateLimiter(ABC):
+    # try_acquire devuelve 0 si la llamada fue admitida o los segundos que
+    # faltan para que lo sea; el estado vive en un StateStore por llave
+    # (usuario, rol, ...), que puede ser local o compartido entre procesos
+
+    # Cantidad de numeros que _step guarda por llave
+    state_width = 1
+
+    def __init__(self, call_limit:int=4, seconds_limit:float=60, store:StateStore=None):
+        self.call_limit, self.seconds_limit = call_limit, seconds_limit
+        self._store = store or SHARED_STATE_STORE
+        self._namespace = (self.__class__.__name__, call_limit, seconds_limit)
+        width = getattr(self._store, 'width', None)
+        if width is not None and self.state_width > width:
+            raise ValueError(
+                f'{self.__class__.__name__} guarda {self.state_width} valores por llave y el store '
+                f'solo admite {width}; use sliding_window, token_bucket o gcra'
+            )
+
+    @abstractmethod
+    def _step(self, state:tuple, now:float) -> tuple:
+        pass
+
+    def try_acquire(self, key=None) -> float:
+        now = time.monotonic()
+        return self._store.update(
+            (*self._namespace, key), lambda state: self._step(state, now)
+        )
+
+    def acquire(self, key=None, timeout:float=None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(key)
+            if wait <= 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if wait > remaining:
+                    return False
+            time.sleep(wait)
+
+    @property
+    def blocking_store(self) -> bool:
+        return not isinstance(self._store, LocalStateStore)
+
+    async def acquire_async(self, key=None, timeout:float=None, executor:Executor=None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.blocking_store:
+                wait = await offload(executor, self.try_acquire, key)
+            else:
+                wait = self.try_acquire(key)
+            if wait <= 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if wait > remaining:
+                    return False
+            await asyncio.sleep(wait)
+
+class FixedWindowLimiter(RateLimiter):
+    state_width = 2
+
+    def _step(self, state:tuple, now:float) -> tuple:
+        if state is None or (now - state[0]) >= self.seconds_limit:
+            state = (now, 0)
+        if state[1] >= self.call_limit:
+            return state, state[0] + self.seconds_limit - now
+        return (state[0], state[1] + 1), 0
+
+class SlidingLogLimiter(RateLimiter):
+    # Exacto pero O(call_limit) en tiempo y memoria por llamada; para limites
+    # altos conviene sliding_window, token_bucket o gcra
+
+    @property
+    def state_width(self):
+        return self.call_limit
+
+    def _step(self, state:tuple, now:float) -> tuple:
+        log = [stamp for stamp in state or () if stamp > now - self.seconds_limit]
+        if len(log) >= self.call_limit:
+            return tuple(log), log[0] + self.seconds_limit - now
+        log.append(now)
+        return tuple(log), 0
+
+class SlidingWindowLimiter(RateLimiter):
+    # Aproximacion con dos contadores: la ventana anterior pesa segun cuanto
+    # se solapa todavia con la ventana deslizante
+    state_width = 3
+
+    def _step(self, state:tuple, now:float) -> tuple:
+        window = self.seconds_limit
+        start, previous, current = state or (now, 0, 0)
+        elapsed = now - start
+        if elapsed >= window:
+            periods = int(elapsed // window)
+            previous = current if periods == 1 else 0
+            start, current = start + periods * window, 0
+            elapsed = now - start
+
+        if previous * (1 - elapsed / window) + current + 1 <= self.call_limit:
+            return (start, previous, current + 1), 0
+        state = (start, previous, current)
+        if current + 1 > self.call_limit or previous == 0:
+            return state, window - elapsed
+        needed = window * (1 - (self.call_limit - current - 1) / previous) - elapsed
+        return state, min(max(needed, 1e-3), window - elapsed)
+
+class TokenBucketLimiter(RateLimiter):
+    state_width = 2
+
+    def __init__(self, call_limit:int=4, seconds_limit:float=60, store:StateStore=None, burst:int=None):
+        super().__init__(call_limit, seconds_limit, store)
+        self.capacity = burst or call_limit
+        self.rate = call_limit / seconds_limit
+
+    def _step(self, state:tuple, now:float) -> tuple:
+        tokens, last = state or (self.capacity, now)
+        tokens = min(self.capacity, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            return (tokens, now), (1 - tokens) / self.rate
+        return (tokens - 1, now), 0
+
+class GCRALimiter(RateLimiter):
+    # Generic Cell Rate Algorithm: solo guarda el "theoretical arrival time"
+
+    def __init__(self, call_limit:int=4, seconds_limit:float=60, store:StateStore=None, burst:int=None):
+        super().__init__(call_limit, seconds_limit, store)
+        self.interval = seconds_limit / call_limit
+        self.tolerance = self.interval * ((burst or call_limit) - 1)
+
+    def _step(self, state:tuple, now:float) -> tuple:
+        tat = max(state[0], now) if state else now
+        if tat - now > self.tolerance:
+            return state, tat - now - self.tolerance
+        return (tat + self.interval,), 0
+
+RATE_LIMIT_ALGORITHMS = {
+    'fixed_window'   : FixedWindowLimiter,
+    'sliding_log'    : SlidingLogLimiter,
+    'sliding_window' : SlidingWindowLimiter,
+    'token_bucket'   : TokenBucketLimiter,
+    'gcra'           : GCRALimiter,
+}
+
+class RateLimitProxy(Service):
+
+    def __init__(self, service:Service, **kwargs):
+        self._real_service  = service
+        self._call_limit    = kwargs.pop('call_limit', 4)
+        self._seconds_limit = kwargs.pop('seconds_limit', 60)
+        algorithm           = kwargs.pop('algorithm', 'sliding_window')
+        store               = kwargs.pop('store', None)
+        self._limiter       = kwargs.pop('limiter', None) or RATE_LIMIT_ALGORITHMS[algorithm](
+            self._call_limit, self._seconds_limit, store
+        )
+        self._key           = kwargs.pop('key', None)
+        self._key_func      = kwargs.pop('key_func', None)
+        self._blocking      = kwargs.pop('blocking', False)
+        self._timeout       = kwargs.pop('timeout', None)
+
+    def generate(self, *args, **kwargs):
+        key = self._rate_key(args, kwargs)
+        if self._blocking:
+            admitted = self._limiter.acquire(key, self._timeout)
+        else:
+            admitted = self._limiter.try_acquire(key) <= 0
+        self._admit(admitted)
+        return self._real_service.generate(*args, **kwargs)
+
+    @property
+    def limiter(self):
+        return self._limiter
+
+    def _rate_key(self, args, kwargs):
+        if self._key_func is not None:
+            return self._key_func(*args, **kwargs)
+        return self._key
+
+    def _admit(self, admitted:bool):
+        if not admitted:
+            raise RateLimitError(
+                f'Maximo nro. de llamadas({self._call_limit}) permitidas en {self._seconds_limit} segundos'
+            )
+
+class AccessPolicy:
+    # Compila las reglas {rol: clases de servicio concedidas} en una tabla
+    # inmutable de pares (rol, clase) permitidos. Una clase concedida habilita
+    # tambien sus clases base (misma semantica que issubclass(concedida, pedida)),
+    # asi cada decision es una sola busqueda O(1). reload arma la tabla nueva
+    # aparte y la publica con una asignacion: los lectores ven la vieja o la nueva
+
+    def __init__(self, rules:dict):
+        self._table, self.version = self._compile(rules), 1
+        self._reload_lock = threading.Lock()
+
+    def allows(self, role:str, service_cls:type) -> bool:
+        return (role, service_cls) in self._table
+
+    def reload(self, rules:dict):
+        table = self._compile(rules)
+        with self._reload_lock:
+            self._table, self.version = table, self.version + 1
+
+    @staticmethod
+    def _compile(rules:dict) -> frozenset:
+        return frozenset(
+            (role, base)
+            for role, granted in rules.items()
+            for service_cls in (granted if isinstance(granted, (list, tuple, set, frozenset)) else (granted,))
+            for base in service_cls.__mro__
+        )
+
+ACCESS_POLICY = AccessPolicy({
+    'admin'   : ReportService,
+    'premium' : ImageService,
+    'free'    : PaymentService,
+})
+
+class AccessControlProxy(Service):
+    def __init__(self, service:Service, service_cls:type[Service], **kwargs):
+        self._real_service = service
+        self._service_cls = service_cls
+        self.user_role = kwargs.pop('user_role')
+        self._policy = kwargs.pop('policy', None) or ACCESS_POLICY
+
+    def generate(self, *args, **kwargs):
+        self._check()
+        return self._real_service.generate(*args, **kwargs)
+
+    def _check(self):
+        if not self._policy.allows(self.user_role, self._service_cls):
+            raise PermissionError(
+                f'El perfil({self.user_role}) no tiene permitido usar el servicio {self._service_cls.__name__}'
+            )
+
+CIRCUIT_STATES = ('CLOSED', 'OPEN', 'HALF-OPEN')
+
+# Limites (en segundos) del histograma de latencias: de 1ms a ~1 minuto en pasos del 20%
+LATENCY_BOUNDS = tuple(0.001 * 1.2 ** exponent for exponent in range(61))
+
+class RollingWindow:
+    # Ventana deslizante de resultados dividida en cubetas de tiempo; cada cubeta
+    # guarda llamadas, fallos, llamadas lentas (contadas exactamente contra
+    # slow_threshold) y un histograma de latencias para estimar el p99
+
+    def __init__(self, window_seconds:float=60, buckets:int=10, slow_threshold:float=None):
+        self._width = window_seconds / buckets
+        self.slow_threshold = slow_threshold
+        self._buckets = [[-1, 0, 0, [0] * (len(LATENCY_BOUNDS) + 1), 0] for _ in range(buckets)]
+        self._lock = threading.Lock()
+
+    def record(self, success:bool, latency:float):
+        with self._lock:
+            bucket = self._current(time.monotonic())
+            bucket[1] += 1
+            if not success:
+                bucket[2] += 1
+            bucket[3][bisect.bisect_left(LATENCY_BOUNDS, latency)] += 1
+            if self.slow_threshold is not None and latency >= self.slow_threshold:
+                bucket[4] += 1
+
+    def snapshot(self) -> tuple:
+        # (llamadas, fallos, llamadas lentas, p99 aproximado)
+        with self._lock:
+            live = self._live()
+            calls = sum(bucket[1] for bucket in live)
+            failures = sum(bucket[2] for bucket in live)
+            slow = sum(bucket[4] for bucket in live)
+            histogram = [sum(counts) for counts in zip(*(bucket[3] for bucket in live))]
+        return calls, failures, slow, self._percentile(histogram, calls, 0.99)
+
+    def percentile(self, quantile:float) -> tuple:
+        # (llamadas en la ventana, latencia aproximada del cuantil)
+        with self._lock:
+            live = self._live()
+            calls = sum(bucket[1] for bucket in live)
+            histogram = [sum(counts) for counts in zip(*(bucket[3] for bucket in live))]
+        return calls, self._percentile(histogram, calls, quantile)
+
+    def _live(self) -> list:
+        oldest = int(time.monotonic() // self._width) - len(self._buckets) + 1
+        return [bucket for bucket in self._buckets if bucket[0] >= oldest]
+
+    def reset(self):
+        with self._lock:
+            for bucket in self._buckets:
+                bucket[0] = -1
+
+    def _current(self, now:float) -> list:
+        index = int(now // self._width)
+        bucket = self._buckets[index % len(self._buckets)]
+        if bucket[0] != index:
+            bucket[0], bucket[1], bucket[2], bucket[4] = index, 0, 0, 0
+            bucket[3] = [0] * (len(LATENCY_BOUNDS) + 1)
+        return bucket
+
+    @staticmethod
+    def _percentile(histogram:list, calls:int, quantile:float) -> float:
+        # Cota inferior de la cubeta: subestima a lo sumo un 20%, nunca sobreestima
+        if not calls:
+            return 0.0
+        target, seen = quantile * calls, 0
+        for position, count in enumerate(histogram):
+            seen += count
+            if seen >= target:
+                return LATENCY_BOUNDS[position - 1] if position else 0.0
+        return LATENCY_BOUNDS[-1]
+
+class CircuitBreakerProxy(Service):
+    # Se abre cuando, con al menos minimum_calls en la ventana, la tasa de error o
+    # el p99 de latencia superan su umbral. Abierto falla rapido con CircuitOpenError;
+    # en HALF-OPEN solo deja pasar half_open_max_calls llamadas de prueba; si una
+    # prueba no termina en failure_timeout se habilita una nueva ronda.
+    # El estado (codigo, hora de apertura, pruebas lanzadas, pruebas exitosas) vive
+    # en un StateStore para compartirlo entre procesos; la ventana es local
+
+    def __init__(self,
+        service:Service,
+        max_failure_error:int=3,
+        store:StateStore=None,
+        key=None,
+        **kwargs
+    ):
+        self._real_service = service
+        self._store = store or LocalStateStore()
+        self._key = ('CircuitBreaker', key)
+        self.max_failure_error = max_failure_error
+        self.failure_rate_threshold = kwargs.pop('failure_rate_threshold', 0.5)
+        self.slow_call_threshold    = kwargs.pop('slow_call_threshold', None)
+        self.minimum_calls          = kwargs.pop('minimum_calls', max_failure_error)
+        self.half_open_max_calls    = kwargs.pop('half_open_max_calls', 1)
+        self.failure_timeout        = kwargs.pop('failure_timeout', 10)
+        self._window = RollingWindow(
+            kwargs.pop('window_seconds', 60), kwargs.pop('window_buckets', 10), self.slow_call_threshold
+        )
+
+    @property
+    def state(self) -> str:
+        return CIRCUIT_STATES[int(self._snapshot()[0])]
+
+    @property
+    def failure_count(self) -> int:
+        return self._window.snapshot()[1]
+
+    @property
+    def last_failure_time(self):
+        return self._snapshot()[1] or None
+
+    def metrics(self) -> dict:
+        calls, failures, slow, p99 = self._window.snapshot()
+        return {
+            'state'        : self.state,
+            'calls'        : calls,
+            'failures'     : failures,
+            'slow_calls'   : slow,
+            'failure_rate' : failures / calls if calls else 0.0,
+            'p99_latency'  : p99,
+        }
+
+    def _snapshot(self) -> tuple:
+        return self._store.get(self._key) or (0, 0.0, 0, 0)
+
+    def generate(self, *args, **kwargs):
+        probe = self._before_call()
+        started = time.monotonic()
+        try:
+            result = self._real_service.generate(*args, **kwargs)
+        except Exception as error:
+            self._on_failure(time.monotonic() - started, probe)
+            raise error
+        except BaseException:
+            if probe:
+                self._release_probe()
+            raise
+
+        self._on_success(time.monotonic() - started, probe)
+        return result
+
+    def _before_call(self) -> bool:
+        # En HALF-OPEN opened_at marca el inicio de la ronda de pruebas
+        def step(state):
+            code, opened_at, probes, successes = state or (0, 0.0, 0, 0)
+            if code == 0:
+                return state, False
+            now = time.time()
+            if code == 1:
+                if (now - opened_at) <= self.failure_timeout:
+                    return state, None
+                code, opened_at, probes, successes = 2, now, 0, 0
+            if probes >= self.half_open_max_calls:
+                if (now - opened_at) <= self.failure_timeout:
+                    return (code, opened_at, probes, successes), None
+                opened_at, probes, successes = now, 0, 0
+            return (code, opened_at, probes + 1, successes), True
+
+        probe = self._store.update(self._key, step)
+        if probe is None:
+            raise CircuitOpenError(
+                f'El servicio {self._real_service.__class__.__name__} no esta disponible por el momento, intentelo más tarde'
+            )
+        return probe
+
+    def _on_success(self, latency:float, probe:bool):
+        self._window.record(True, latency)
+        if not probe:
+            self._check_trip()
+            return
+        if self.slow_call_threshold is not None and latency >= self.slow_call_threshold:
+            self._open()
+            return
+
+        def step(state):
+            code, opened_at, probes, successes = state or (0, 0.0, 0, 0)
+            if code != 2:
+                return state, False
+            if successes + 1 >= self.half_open_max_calls:
+                return (0, opened_at, 0, 0), True
+            return (code, opened_at, probes, successes + 1), False
+
+        if self._store.update(self._key, step):
+            self._window.reset()
+
+    def _on_failure(self, latency:float, probe:bool):
+        self._window.record(False, latency)
+        if probe:
+            self._open()
+        else:
+            self._check_trip()
+
+    def _release_probe(self):
+        # Una prueba cancelada (CancelledError, KeyboardInterrupt) no cuenta como
+        # fallo ni exito, pero debe devolver su cupo
+        def step(state):
+            code, opened_at, probes, successes = state or (0, 0.0, 0, 0)
+            if code != 2 or not probes:
+                return state, None
+            return (code, opened_at, probes - 1, successes), None
+        self._store.update(self._key, step)
+
+    def _check_trip(self):
+        # El p99 supera el umbral cuando mas del 1% de las llamadas son lentas
+        calls, failures, slow, _ = self._window.snapshot()
+        if calls < self.minimum_calls:
+            return
+        if failures / calls >= self.failure_rate_threshold or slow > 0.01 * calls:
+            self._open(only_from_closed=True)
+
+    def _open(self, only_from_closed:bool=False):
+        def step(state):
+            code = state[0] if state else 0
+            if only_from_closed and code != 0:
+                return state, None
+            return (1, time.time(), 0, 0), None
+        self._store.update(self._key, step)
+
+class Bulkhead:
+    # Limita las llamadas simultaneas a max_concurrent; las que sobran esperan en
+    # una cola FIFO de hasta max_queue llamadores y se rechazan con
+    # BulkheadFullError si la cola esta llena o si esperan mas de queue_timeout.
+    # Al liberar, el cupo pasa directo al primer llamador en cola, asi hilos y
+    # corrutinas de distintos event loops pueden compartir el mismo Bulkhead
+
+    def __init__(self, max_concurrent:int=10, max_queue:int=0, queue_timeout:float=None, name=None):
+        self.max_concurrent, self.max_queue, self.queue_timeout = max_concurrent, max_queue, queue_timeout
+        self.name = name
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = deque()
+        self.admitted = self.rejected = self.timed_out = self.max_queue_depth = 0
+        self.total_wait = self.max_wait = 0.0
+
+    def acquire(self, timeout:float=_MISSING):
+        timeout = self.queue_timeout if timeout is _MISSING else timeout
+        started = time.monotonic()
+        event = threading.Event()
+        waiter = [event.set, False]
+        if self._enter(waiter):
+            return
+        if not event.wait(timeout):
+            self._abandon(waiter, started)
+        self._admitted(started)
+
+    async def acquire_async(self, timeout:float=_MISSING):
+        timeout = self.queue_timeout if timeout is _MISSING else timeout
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+        waiter = [partial(loop.call_soon_threadsafe, self._grant_future, granted), False]
+        if self._enter(waiter):
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), timeout)
+        except asyncio.TimeoutError:
+            self._abandon(waiter, started)
+        except asyncio.CancelledError:
+            # Si el cupo llego justo al cancelar hay que devolverlo
+            with self._lock:
+                granted_slot = waiter[1]
+                if not granted_slot:
+                    self._waiters.remove(waiter)
+            if granted_slot:
+                self.release()
+            raise
+        self._admitted(started)
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter[1] = True
+                waiter[0]()
+            else:
+                self._active -= 1
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                'active'          : self._active,
+                'queue_depth'     : len(self._waiters),
+                'max_queue_depth' : self.max_queue_depth,
+                'admitted'        : self.admitted,
+                'rejected'        : self.rejected,
+                'timed_out'       : self.timed_out,
+                'avg_wait'        : self.total_wait / self.admitted if self.admitted else 0.0,
+                'max_wait'        : self.max_wait,
+            }
+
+    def _enter(self, waiter:list) -> bool:
+        # True si entra de inmediato; False si quedo en cola
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                self.admitted += 1
+                return True
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise BulkheadFullError(
+                    f'{self.name or "Bulkhead"}: {self._active} llamadas en curso y la cola de espera esta llena'
+                )
+            self._waiters.append(waiter)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+            return False
+
+    def _abandon(self, waiter:list, started:float):
+        # Vencio la espera; si el cupo llego entre tanto se conserva
+        with self._lock:
+            if waiter[1]:
+                return
+            self._waiters.remove(waiter)
+            self.timed_out += 1
+        raise BulkheadFullError(
+            f'{self.name or "Bulkhead"}: se espero {time.monotonic() - started:.3f}s sin obtener un cupo'
+        )
+
+    def _admitted(self, started:float):
+        waited = time.monotonic() - started
+        with self._lock:
+            self.admitted += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    @staticmethod
+    def _grant_future(future):
+        if not future.done():
+            future.set_result(None)
+
+class BulkheadRegistry:
+    # Un Bulkhead por llave (servicio, o servicio y rol), compartido por todos los
+    # proxies aunque se creen por request; la primera configuracion es la que vale
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bulkheads = {}
+
+    def get(self, key, **options) -> Bulkhead:
+        with self._lock:
+            bulkhead = self._bulkheads.get(key)
+            if bulkhead is None:
+                bulkhead = self._bulkheads[key] = Bulkhead(name=key, **options)
+            return bulkhead
+
+SHARED_BULKHEADS = BulkheadRegistry()
+
+class BulkheadProxy(Service):
+
+    def __init__(self, service:Service, key=None, registry:BulkheadRegistry=None, **kwargs):
+        self._real_service = service
+        self._bulkhead = kwargs.pop('bulkhead', None) or (registry or SHARED_BULKHEADS).get(
+            key or service.__class__.__name__,
+            max_concurrent = kwargs.pop('max_concurrent', 10),
+            max_queue      = kwargs.pop('max_queue', 0),
+            queue_timeout  = kwargs.pop('queue_timeout', None),
+        )
+
+    def generate(self, *args, **kwargs):
+        with self._bulkhead.slot():
+            return self._real_service.generate(*args, **kwargs)
+
+    @property
+    def bulkhead(self):
+        return self._bulkhead
+
+    def metrics(self) -> dict:
+        return self._bulkhead.metrics()
+
+# Deadline absoluto (time.monotonic) de la llamada en curso; los proxies lo leen
+# para acotar sus esperas y contextvars lo propaga a hilos del pool y a tareas
+CURRENT_DEADLINE = contextvars.ContextVar('CURRENT_DEADLINE', default=None)
+
+# Pool compartido donde DeadlineProxy y HedgingProxy corren servicios sincronos
+CALL_EXECUTOR = ThreadPoolExecutor(thread_name_prefix='proxy-calls')
+
+@contextmanager
+def call_deadline(seconds:float):
+    # Fija un presupuesto para todo lo que se llame dentro del bloque; un
+    # deadline exterior mas cercano sigue mandando
+    deadline = time.monotonic() + seconds
+    current = CURRENT_DEADLINE.get()
+    token = CURRENT_DEADLINE.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        CURRENT_DEADLINE.reset(token)
+
+def remaining_time() -> float:
+    deadline = CURRENT_DEADLINE.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+class DeadlineProxy(Service):
+    # Cada llamada tiene hasta timeout segundos (o lo que quede del deadline
+    # heredado). Se rechaza sin llamar al servicio si el presupuesto restante es
+    # menor que min_remaining o que el cuantil reject_quantile de las latencias
+    # observadas. El servicio corre en un pool: al vencer el plazo el llamador
+    # recibe DeadlineExceededError, pero un hilo ya iniciado no se puede matar
+
+    def __init__(self, service:Service, timeout:float=None, **kwargs):
+        self._real_service = service
+        self.timeout = timeout
+        self.min_remaining   = kwargs.pop('min_remaining', 0.0)
+        self.reject_quantile = kwargs.pop('reject_quantile', None)
+        self.minimum_calls   = kwargs.pop('minimum_calls', 10)
+        self._executor       = kwargs.pop('executor', None) or CALL_EXECUTOR
+        self._window = RollingWindow(kwargs.pop('window_seconds', 60), kwargs.pop('window_buckets', 10))
+        self.rejected = self.expired = 0
+
+    def generate(self, *args, **kwargs):
+        deadline = self._deadline()
+        if deadline is None:
+            return self._real_service.generate(*args, **kwargs)
+
+        token = CURRENT_DEADLINE.set(deadline)
+        try:
+            context = contextvars.copy_context()
+        finally:
+            CURRENT_DEADLINE.reset(token)
+        started = time.monotonic()
+        future = self._executor.submit(context.run, self._real_service.generate, *args, **kwargs)
+        try:
+            result = future.result(max(deadline - started, 0))
+        except FutureTimeoutError:
+            future.cancel()
+            self._expire()
+        self._window.record(True, time.monotonic() - started)
+        return result
+
+    def _deadline(self):
+        now = time.monotonic()
+        inherited = CURRENT_DEADLINE.get()
+        deadline = None if self.timeout is None else now + self.timeout
+        if inherited is not None:
+            deadline = inherited if deadline is None else min(deadline, inherited)
+        if deadline is None:
+            return None
+
+        required = self.min_remaining
+        if self.reject_quantile is not None:
+            calls, latency = self._window.percentile(self.reject_quantile)
+            if calls >= self.minimum_calls:
+                required = max(required, latency)
+        if deadline - now <= required:
+            self.rejected += 1
+            raise DeadlineExceededError(
+                f'Quedan {max(deadline - now, 0) * 1000:.1f}ms y {self._real_service.__class__.__name__} '
+                f'necesita al menos {required * 1000:.1f}ms'
+            )
+        return deadline
+
+    def _expire(self):
+        self.expired += 1
+        raise DeadlineExceededError(
+            f'{self._real_service.__class__.__name__} no respondio dentro del plazo'
+        )
+
+class HedgingProxy(Service):
+    # Si la llamada no termina en hedge_delay segundos (por defecto el cuantil
+    # hedge_quantile de las latencias observadas) lanza un duplicado a la
+    # siguiente replica, hasta max_hedges veces, y devuelve la primera respuesta
+    # exitosa. Un fallo dispara el siguiente intento de inmediato. Solo tiene
+    # sentido para llamadas idempotentes (reportes, imagenes), nunca para pagos
+
+    def __init__(self, service:Service, replicas:list=None, **kwargs):
+        self._real_service = service
+        self._replicas = [service, *(replicas or [service])]
+        self.max_hedges      = kwargs.pop('max_hedges', 1)
+        self.hedge_quantile  = kwargs.pop('hedge_quantile', 0.95)
+        self.initial_delay   = kwargs.pop('initial_delay', 1.0)
+        self.minimum_calls   = kwargs.pop('minimum_calls', 20)
+        self._fixed_delay    = kwargs.pop('hedge_delay', None)
+        self._executor       = kwargs.pop('executor', None) or CALL_EXECUTOR
+        self._window = RollingWindow(kwargs.pop('window_seconds', 60), kwargs.pop('window_buckets', 10))
+        self.hedges_sent = self.hedge_wins = 0
+
+    def hedge_delay(self) -> float:
+        if self._fixed_delay is not None:
+            return self._fixed_delay
+        calls, latency = self._window.percentile(self.hedge_quantile)
+        return latency if calls >= self.minimum_calls else self.initial_delay
+
+    def generate(self, *args, **kwargs):
+        deadline = CURRENT_DEADLINE.get()
+        pending = {self._launch(0, args, kwargs): 0}
+        launched, error = 1, None
+        try:
+            while True:
+                hedge_due = launched <= self.max_hedges
+                timeout = self._wait_time(self.hedge_delay() if hedge_due else None, deadline)
+                done, _ = wait_futures(pending, timeout, FIRST_COMPLETED)
+                for future in done:
+                    attempt = pending.pop(future)
+                    if future.exception() is None:
+                        self.hedge_wins += attempt > 0
+                        return future.result()
+                    error = future.exception()
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise DeadlineExceededError(
+                        f'{self._real_service.__class__.__name__} no respondio dentro del plazo'
+                    )
+                if hedge_due and (not done or not pending):
+                    pending[self._launch(launched, args, kwargs)] = launched
+                    launched += 1
+                    self.hedges_sent += 1
+                elif not pending:
+                    raise error
+        finally:
+            # Los intentos que todavia no arrancaron se descartan; los que ya
+            # corren terminan en el pool y su latencia igual alimenta la ventana
+            for future in pending:
+                future.cancel()
+
+    def metrics(self) -> dict:
+        return {
+            'hedge_delay' : self.hedge_delay(),
+            'hedges_sent' : self.hedges_sent,
+            'hedge_wins'  : self.hedge_wins,
+        }
+
+    def _launch(self, attempt:int, args, kwargs) -> Future:
+        # Un contexto por intento: un mismo Context no puede estar activo en dos hilos
+        replica = self._replicas[attempt % len(self._replicas)]
+        context = contextvars.copy_context()
+        return self._executor.submit(context.run, self._timed, replica.generate, args, kwargs)
+
+    def _timed(self, generate, args, kwargs):
+        started = time.monotonic()
+        result = generate(*args, **kwargs)
+        self._window.record(True, time.monotonic() - started)
+        return result
+
+    @staticmethod
+    def _wait_time(delay:float, deadline:float):
+        if deadline is None:
+            return delay
+        remaining = max(deadline - time.monotonic(), 0)
+        return remaining if delay is None else min(delay, remaining)
+
+class GlobalServiceProxy(Service):
+
+    def __init__(self,
+        service_cls:type[Service],
+        user_role:str,
+        store:StateStore=None,
+        batching:bool=False,
+        sink=None,
+        call_limit:int=4,
+        seconds_limit:float=60,
+        algorithm:str='sliding_window',
+        bulkhead:dict=None,
+        pool:PooledLazyProxy=None
+    ):
+        # pool es un PooledLazyProxy creado una vez y compartido entre requests
+        self._service_cls = service_cls
+        service = pool if pool is not None else LazyLoadingProxy(service_cls)
+        self._batching = None
+        if batching and hasattr(service_cls, 'generate_batch'):
+            service = self._batching = BatchingProxy(service)
+        self._circuit = CircuitBreakerProxy(
+            AccessControlProxy(
+                service,
+                service_cls=service_cls,
+                user_role=user_role
+            ),
+            store=store,
+            key=service_cls.__name__
+        )
+        # El bulkhead va debajo de la cache: los aciertos no ocupan cupo
+        protected = self.circuit
+        if bulkhead is not None:
+            protected = BulkheadProxy(self.circuit, **self._bulkhead_options(service_cls, user_role, bulkhead))
+        key_builder = CacheKeyBuilder()
+        self._cache = CachingProxy(protected, coalesce=True, key_builder=key_builder)
+        self._rate_limit = RateLimitProxy(
+            self._cache,
+            key=user_role,
+            store=store,
+            call_limit=call_limit,
+            seconds_limit=seconds_limit,
+            algorithm=algorithm
+        )
+        self._proxy_pipeline = BufferedLoggingProxy(self._rate_limit, sink=sink, key_builder=key_builder)
+
+    def generate(self, *args, **kwargs):
+        return self._proxy_pipeline.generate(*args, **kwargs)
+
+    # Cuerpo de la funcion compilada: logging, rate limit y acierto en BoundedCache
+    # quedan en linea; un fallo de cache delega en CachingProxy._generate_keyed, que
+    # llama al mismo circuito -> ACL -> servicio que la version por capas
+    COMPILED_BODY = '''
+    _started = _monotonic()
+    _key = {key}
+    try:
+{rate_limit}
+        with _cache_lock:
+            _entry = _entries.get(_key)
+            if _entry is not None and (_entry[2] is None or _entry[2] > _started + _ahead):
+                _on_access(_key)
+                _entry[3] += 1
+                _bounded.hits += 1
+                _caching.cache_hits += 1
+                _result = _entry[0]
+            else:
+                _result = _MISSING
+        if _result is _MISSING:
+            _result = _generate_keyed(_key, {call_args}, {call_kwargs})
+    except Exception as _error:
+        _put((_started, _service_id, _key, _monotonic() - _started, _error.__class__.__name__))
+        raise _error
+    _sequence = _next(_counter)
+    _slots[_sequence % _capacity] = (_sequence, (_started, _service_id, _key, _monotonic() - _started, 'ok'))
+    return _result
+'''
+
+    # Con LocalStateStore el paso del limitador se aplica directo sobre su dict
+    LOCAL_RATE_LIMIT = '''\
+        with _limit_lock:
+            _state, _wait = _step(_states.get(_limit_key), _started)
+            _states[_limit_key] = _state
+        if _wait > 0:
+            _admit(False)'''
+
+    STORE_RATE_LIMIT = '''\
+        if _try_acquire(_rate_key) > 0:
+            _admit(False)'''
+
+    BLOCKING_RATE_LIMIT = '''\
+        _admit(_acquire(_rate_key, _timeout))'''
+
+    def compile(self):
+        # Devuelve una funcion con la firma real de service_cls.generate que se
+        # comporta igual que generate(). La llave de cache siempre se arma con los
+        # argumentos por nombre, asi que f(1) y f(report_id=1) comparten entrada
+        rate_limit, limiter = self._rate_limit, self._rate_limit.limiter
+        cache, bounded, buffer = self._cache, self._cache._cache, self._proxy_pipeline.buffer
+        namespace = {
+            '_MISSING'        : _MISSING,
+            '_monotonic'      : time.monotonic,
+            '_admit'          : rate_limit._admit,
+            '_try_acquire'    : limiter.try_acquire,
+            '_acquire'        : limiter.acquire,
+            '_rate_key'       : rate_limit._key,
+            '_timeout'        : rate_limit._timeout,
+            '_cache_lock'     : bounded._lock,
+            '_entries'        : bounded._entries,
+            '_ahead'          : cache.refresh_ahead or 0,
+            '_on_access'      : bounded._policy.on_access,
+            '_bounded'        : bounded,
+            '_caching'        : cache,
+            '_generate_keyed' : cache._generate_keyed,
+            '_key_builder'    : cache._key_builder,
+            '_part'           : cache._key_builder._part,
+            '_scalars'        : frozenset((int, float, bool, type(None))),
+            '_service_id'     : self._proxy_pipeline._service_id,
+            '_put'            : buffer.put,
+            '_next'           : next,
+            '_counter'        : buffer._sequence,
+            '_slots'          : buffer._slots,
+            '_capacity'       : buffer.capacity,
+        }
+
+        if rate_limit._blocking:
+            rate_block = self.BLOCKING_RATE_LIMIT
+        elif isinstance(limiter._store, LocalStateStore):
+            rate_block = self.LOCAL_RATE_LIMIT
+            namespace.update({
+                '_limit_lock' : limiter._store._lock,
+                '_states'     : limiter._store._states,
+                '_step'       : limiter._step,
+                '_limit_key'  : (*limiter._namespace, rate_limit._key),
+            })
+        else:
+            rate_block = self.STORE_RATE_LIMIT
+
+        parameters = self._fixed_parameters()
+        if parameters is None:
+            header = 'def generate(*args, **kwargs):'
+            key, call_args, call_kwargs = '_key_builder(args, kwargs)', 'args', 'kwargs'
+        else:
+            signature = []
+            for name, default in parameters:
+                if default is inspect.Parameter.empty:
+                    signature.append(name)
+                else:
+                    namespace[f'_default_{name}'] = default
+                    signature.append(f'{name}=_default_{name}')
+            names = sorted(name for name, _ in parameters)
+            header = f"def generate({', '.join(signature)}):"
+            key = '((), ({}))'.format(''.join(
+                f"('{name}', {name} if type({name}) in _scalars else _part({name})), " for name in names
+            ))
+            call_args = '()'
+            call_kwargs = '{' + ', '.join(f"'{name}': {name}" for name in names) + '}'
+
+        source = header + self.COMPILED_BODY.format(
+            key=key, rate_limit=rate_block, call_args=call_args, call_kwargs=call_kwargs
+        )
+        exec(compile(source, f'<compiled {self._service_cls.__name__}>', 'exec'), namespace)
+        return namespace['generate']
+
+    @staticmethod
+    def _bulkhead_options(service_cls:type, user_role:str, bulkhead:dict) -> dict:
+        # bulkhead = {'max_concurrent': .., 'max_queue': .., 'queue_timeout': .., 'per_role': ..}
+        options = dict(bulkhead)
+        per_role = options.pop('per_role', False)
+        options['key'] = (service_cls.__name__, user_role) if per_role else service_cls.__name__
+        return options
+
+    def _fixed_parameters(self):
+        # (nombre, valor por defecto) de cada parametro de generate, o None si la
+        # firma no es fija (*args, **kwargs, solo posicionales o solo por nombre)
+        try:
+            parameters = list(inspect.signature(self._service_cls.generate).parameters.values())[1:]
+        except (TypeError, ValueError):
+            return None
+        if not parameters or any(
+            parameter.kind != inspect.Parameter.POSITIONAL_OR_KEYWORD or parameter.name.startswith('_')
+            for parameter in parameters
+        ):
+            return None
+        return [(parameter.name, parameter.default) for parameter in parameters]
+
+    def close(self):
+        # Escribe los registros pendientes en el sink y detiene los hilos de fondo
+        self._proxy_pipeline.close()
+        if self._batching is not None:
+            self._batching.close()
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def circuit(self):
+        return self._circuit
+
+### Versiones asincronas: mismas politicas, pero el servicio real se espera con await
+
+class AsyncService(ABC):
 
     @abstractmethod
-    def generate(self, *args, **kwargs):
+    async def generate(self, *args, **kwargs):
         pass
 
-class PaymentService(Service):
+class ExecutorServiceAdapter(AsyncService):
+    # Puente para servicios sincronos: la llamada bloqueante corre en un executor
 
-    def generate(self, user:str, amount:float):
-        print('Generando pago...')
-        time.sleep(random.uniform(0.5, 1.5))
-        result = bool(random.randint(0,1))
-        if result:
-            return result, f'Pago para {user} con el monto {amount} procesado éxitosamente'
-        return result, 'El pago no pudo ser procesado'
+    def __init__(self, service:Service, executor:Executor=None):
+        self._real_service = service
+        self._executor = executor
 
-class ReportService(Service):
+    async def generate(self, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, partial(self._real_service.generate, *args, **kwargs)
+        )
 
-    def generate(self, report_id:int):
-        print(f'Generando reporte {report_id}...')
-        time.sleep(random.uniform(1.0, 2.0))
-        result = report_id < 5
-        if result:
-            return 'Reporte generado éxitosamente'
-        return 'El reporte no pudo ser generado correctamente'
+def as_async(service, executor:Executor=None) -> AsyncService:
+    if isinstance(service, AsyncService):
+        return service
+    return ExecutorServiceAdapter(service, executor)
 
-class ImageService(Service):
+async def offload(executor:Executor, fn, *args):
+    # Para trabajo bloqueante de las politicas (sqlite, flock) que no debe frenar el loop
+    return await asyncio.get_running_loop().run_in_executor(executor, partial(fn, *args))
 
-    def generate(self, image:bytes):
-        print('Procesando imagen...')
-        time.sleep(random.uniform(2.0, 3.0))
-        result = bool(random.randint(0,1))
-        if result:
-            return 'Imagen procesado correctamente'
-        return 'La imagen se encuentra corrupta o dañana, no pudo ser procesada'
+class AsyncLoggingProxy(LoggingProxy, AsyncService):
 
-###
+    def __init__(self, service, executor:Executor=None):
+        super().__init__(as_async(service, executor))
 
-class LoggingProxy(Service):
+    async def generate(self, *args, **kwargs):
+        self._record(args, kwargs)
+        return await self._real_service.generate(*args, **kwargs)
 
-    def __init__(self, service:Service):
-        self._real_service = service
-        self.logs = []
+class AsyncBufferedLoggingProxy(BufferedLoggingProxy, AsyncService):
 
-    def generate(self, *args, **kwargs):
-        self.logs.append(
-            f'time: {time.strftime("%Y-%m-%dT%H:%M:%S")} \
-            service: {self._real_service.__class__.__name__} \
-            args: {args} \
-            kwargs: {kwargs}'
+    def __init__(self, service, executor:Executor=None, **kwargs):
+        super().__init__(as_async(service, executor), **kwargs)
+
+    async def generate(self, *args, **kwargs):
+        started = time.monotonic()
+        try:
+            result = await self._real_service.generate(*args, **kwargs)
+        except Exception as error:
+            self._record(started, args, kwargs, error.__class__.__name__)
+            raise error
+        self._record(started, args, kwargs, 'ok')
+        return result
+
+class AsyncCachingProxy(CachingProxy, AsyncService):
+    # Con disk_cache las lecturas y escrituras a sqlite se hacen en el executor
+
+    def __init__(self, service, executor:Executor=None, **kwargs):
+        super().__init__(as_async(service, executor), **kwargs)
+        self._executor = executor
+
+    async def generate(self, *args, **kwargs):
+        self._loop = asyncio.get_running_loop()
+        cache_args = self._key_builder(args, kwargs)
+        result = await self._lookup_async(cache_args, args, kwargs)
+        if result is not _MISSING:
+            return result
+
+        if self._flights is None:
+            return await self._load(cache_args, args, kwargs)
+        return await self._flights.do_async(cache_args, self._lead, cache_args, args, kwargs)
+
+    async def _lead(self, cache_args, args, kwargs):
+        result = await self._lookup_async(cache_args, args, kwargs)
+        if result is not _MISSING:
+            return result
+        return await self._load(cache_args, args, kwargs)
+
+    async def _lookup_async(self, cache_args, args, kwargs):
+        if self._disk is None:
+            return self._lookup(cache_args, args, kwargs)
+        return await offload(self._executor, self._lookup, cache_args, args, kwargs)
+
+    def _start_refresh(self, cache_args, args, kwargs):
+        # _lookup puede correr en el executor: el refresco se agenda en el loop del llamador
+        asyncio.run_coroutine_threadsafe(self._refresh_async(cache_args, args, kwargs), self._loop)
+
+    async def _refresh_async(self, cache_args, args, kwargs):
+        try:
+            result = await self._real_service.generate(*args, **kwargs)
+            if self._disk is None:
+                self._store(cache_args, result)
+            else:
+                await offload(self._executor, self._store, cache_args, result)
+            self.refreshes += 1
+        except Exception:
+            self.refresh_errors += 1
+        finally:
+            self._refresh_done(cache_args)
+
+    async def _load(self, cache_args, args, kwargs):
+        print(
+            f'Service: {self._real_service.__class__.__name__} args: {cache_args} saving in cache...'
         )
-        return self._real_service.generate(*args, **kwargs)
+        result = await self._real_service.generate(*args, **kwargs)
+        if self._disk is None:
+            self._store(cache_args, result)
+        else:
+            await offload(self._executor, self._store, cache_args, result)
+        return result
 
-    # def drop_and_wirte_logs(self):
-    #     while self.logs:
-    #         print(self.logs.pop(0))
+class AsyncLazyLoadingProxy(LazyLoadingProxy, AsyncService):
 
-class CachingProxy(Service):
+    def __init__(self, service_cls:type, executor:Executor=None):
+        super().__init__(service_cls)
+        self._executor = executor
 
-    def __init__(self, service:Service):
-        self._real_service, self.__cache = service, {}
-        self.real_call_count = self.cache_hits = 0
+    async def generate(self, *args, **kwargs):
+        return await self._get_service().generate(*args, **kwargs)
 
-    def generate(self, *args, **kwargs):
-        cache_args = tuple(list(args) + list(kwargs.values()))
-        if cache_args in self.__cache:
-            self.cache_hits += 1
+    def _create(self):
+        return as_async(self._service_cls(), self._executor)
+
+class AsyncRateLimitProxy(RateLimitProxy, AsyncService):
+
+    def __init__(self, service, executor:Executor=None, **kwargs):
+        super().__init__(as_async(service, executor), **kwargs)
+        self._executor = executor
+
+    async def generate(self, *args, **kwargs):
+        key = self._rate_key(args, kwargs)
+        if self._blocking:
+            admitted = await self._limiter.acquire_async(key, self._timeout, self._executor)
+        elif self._limiter.blocking_store:
+            admitted = await offload(self._executor, self._limiter.try_acquire, key) <= 0
         else:
-            print(
-                f'Service: {self._real_service.__class__.__name__} args: {cache_args} saving in cache...'
-            )
-            self.__cache[cache_args] = self._real_service.generate(*args, **kwargs)
-            self.real_call_count += 1
-        return self.__cache[cache_args]
+            admitted = self._limiter.try_acquire(key) <= 0
+        self._admit(admitted)
+        return await self._real_service.generate(*args, **kwargs)
 
-class LazyLoadingProxy(Service):
-    def __init__(self, service_cls:type[Service]):
-        self._service_cls = service_cls
-        self._real_service = None
+class AsyncAccessControlProxy(AccessControlProxy, AsyncService):
 
-    def generate(self, *args, **kwargs):
-        if self._real_service is None:
-            print(f'Generando por unica vez instancia de {self._service_cls.__name__}')
-            self._real_service = self._service_cls()
-        return self._real_service.generate(*args, **kwargs)
+    def __init__(self, service, service_cls:type, executor:Executor=None, **kwargs):
+        super().__init__(as_async(service, executor), service_cls, **kwargs)
 
-class RateLimitProxy(Service):
+    async def generate(self, *args, **kwargs):
+        self._check()
+        return await self._real_service.generate(*args, **kwargs)
 
-    def __init__(self, service:Service, **kwargs):
-        self._real_service  = service
-        self._call_limit    = kwargs.pop('call_limit', 4)
-        self._seconds_limit = kwargs.pop('seconds_limit', 60)
-        self._timer, self._counter,  = None, 0
+class AsyncCircuitBreakerProxy(CircuitBreakerProxy, AsyncService):
+    # Si el StateStore es compartido (flock) las transiciones se hacen en el executor
 
-    def generate(self, *args, **kwargs):
-        if self._timer is None:
-            self._timer = time.time()
+    def __init__(self, service, executor:Executor=None, **kwargs):
+        super().__init__(as_async(service, executor), **kwargs)
+        self._executor = executor
+        self._blocking_store = not isinstance(self._store, LocalStateStore)
 
-        if (time.time() - self._timer) >= self._seconds_limit:
-            self._timer, self._counter = time.time(), 0
+    async def generate(self, *args, **kwargs):
+        probe = await self._policy(self._before_call)
+        started = time.monotonic()
+        try:
+            result = await self._real_service.generate(*args, **kwargs)
+        except Exception as error:
+            await self._policy(self._on_failure, time.monotonic() - started, probe)
+            raise error
+        except BaseException:
+            if probe:
+                await self._policy(self._release_probe)
+            raise
 
-        if self._counter >= self._call_limit:
-            raise RateLimitError(
-                f'Maximo nro. de llamadas({self._call_limit}) permitidas en {self._seconds_limit} segundos'
-            )
+        await self._policy(self._on_success, time.monotonic() - started, probe)
+        return result
 
-        self._counter += 1
+    async def _policy(self, fn, *args):
+        if self._blocking_store:
+            return await offload(self._executor, fn, *args)
+        return fn(*args)
 
-        return self._real_service.generate(*args, **kwargs)
+class AsyncBulkheadProxy(BulkheadProxy, AsyncService):
+    # La espera en cola es un await: no bloquea el event loop
 
-class AccessControlProxy(Service):
-    def __init__(self, service:Service, service_cls:type[Service], **kwargs):
-        self._real_service = service
-        self._service_cls = service_cls
-        self.user_role = kwargs.pop('user_role')
-        acl_map = {
-            'admin'   : ReportService,
-            'premium' : ImageService,
-            'free'    : PaymentService,
-        }
+    def __init__(self, service, executor:Executor=None, **kwargs):
+        super().__init__(as_async(service, executor), **kwargs)
 
-        self._allowed = self.user_role in acl_map and issubclass(acl_map[self.user_role], service_cls)
+    async def generate(self, *args, **kwargs):
+        await self._bulkhead.acquire_async()
+        try:
+            return await self._real_service.generate(*args, **kwargs)
+        finally:
+            self._bulkhead.release()
 
-    def generate(self, *args, **kwargs):
-        if not self._allowed:
-            raise PermissionError(
-                f'El perfil({self.user_role}) no tiene permitido usar el servicio {self._service_cls.__name__}'
-            )
+class AsyncDeadlineProxy(DeadlineProxy, AsyncService):
+    # En async el servicio se cancela de verdad al vencer el plazo
 
-        return self._real_service.generate(*args, **kwargs)
+    def __init__(self, service, executor:Executor=None, **kwargs):
+        super().__init__(as_async(service, executor), **kwargs)
 
-class CircuitBreakerProxy(Service):
+    async def generate(self, *args, **kwargs):
+        deadline = self._deadline()
+        if deadline is None:
+            return await self._real_service.generate(*args, **kwargs)
 
-    def __init__(self, service:Service, max_failure_error:int=3):
-        self._real_service = service
-        self.state = 'CLOSED'
-        self.failure_count = 0
-        self.max_failure_error = max_failure_error
-        self.last_failure_time = None
-        self.failure_timeout = 10
+        token = CURRENT_DEADLINE.set(deadline)
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(
+                self._real_service.generate(*args, **kwargs), max(deadline - started, 0)
+            )
+        except asyncio.TimeoutError:
+            self._expire()
+        finally:
+            CURRENT_DEADLINE.reset(token)
+        self._window.record(True, time.monotonic() - started)
+        return result
 
-    def generate(self, *args, **kwargs):
-        if self.state == 'OPEN':
-            if (time.time() - self.last_failure_time) > self.failure_timeout:
-                self.state = 'HALF-OPEN'
-            else:
-                return 'El servicio no esta disponible por el momento intentelo más tarde'
+class AsyncHedgingProxy(HedgingProxy, AsyncService):
+    # Los intentos son tareas; al llegar la primera respuesta el resto se cancela
+
+    def __init__(self, service, replicas:list=None, executor:Executor=None, **kwargs):
+        super().__init__(
+            as_async(service, executor),
+            [as_async(replica, executor) for replica in replicas] if replicas else None,
+            **kwargs
+        )
+
+    async def generate(self, *args, **kwargs):
+        deadline = CURRENT_DEADLINE.get()
+        pending = {self._launch_task(0, args, kwargs): 0}
+        launched, error = 1, None
         try:
-            result = self._real_service.generate(*args, **kwargs)
-            self.state = 'CLOSED'
-        except Exception as error:
-            self.failure_count += 1
+            while True:
+                hedge_due = launched <= self.max_hedges
+                timeout = self._wait_time(self.hedge_delay() if hedge_due else None, deadline)
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    attempt = pending.pop(task)
+                    if task.exception() is None:
+                        self.hedge_wins += attempt > 0
+                        return task.result()
+                    error = task.exception()
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise DeadlineExceededError(
+                        f'{self._real_service.__class__.__name__} no respondio dentro del plazo'
+                    )
+                if hedge_due and (not done or not pending):
+                    pending[self._launch_task(launched, args, kwargs)] = launched
+                    launched += 1
+                    self.hedges_sent += 1
+                elif not pending:
+                    raise error
+        finally:
+            for task in pending:
+                task.cancel()
 
-            if self.failure_count >= self.max_failure_error:
-                self.state = 'OPEN'
-                self.last_failure_time = time.time()
-            raise error
+    def _launch_task(self, attempt:int, args, kwargs):
+        replica = self._replicas[attempt % len(self._replicas)]
+        return asyncio.ensure_future(self._timed_async(replica.generate, args, kwargs))
 
+    async def _timed_async(self, generate, args, kwargs):
+        started = time.monotonic()
+        result = await generate(*args, **kwargs)
+        self._window.record(True, time.monotonic() - started)
         return result
 
-class GlobalServiceProxy(Service):
+class AsyncGlobalServiceProxy(AsyncService):
 
-    def __init__(self, service_cls:type[Service], user_role:str):
-        self._circuit = CircuitBreakerProxy(
-            AccessControlProxy(
-                LazyLoadingProxy(service_cls),
+    def __init__(self,
+        service_cls:type,
+        user_role:str,
+        executor:Executor=None,
+        store:StateStore=None,
+        batching:bool=False,
+        call_limit:int=4,
+        seconds_limit:float=60,
+        sink=None,
+        algorithm:str='sliding_window',
+        bulkhead:dict=None,
+        pool:PooledLazyProxy=None
+    ):
+        self._executor = executor
+        self._batching = None
+        if batching and hasattr(service_cls, 'generate_batch'):
+            self._batching = BatchingProxy(pool if pool is not None else LazyLoadingProxy(service_cls))
+            service = as_async(self._batching, executor)
+        elif pool is not None:
+            service = as_async(pool, executor)
+        else:
+            service = AsyncLazyLoadingProxy(service_cls, executor)
+        self._circuit = AsyncCircuitBreakerProxy(
+            AsyncAccessControlProxy(
+                service,
                 service_cls=service_cls,
                 user_role=user_role
+            ),
+            executor=executor,
+            store=store,
+            key=service_cls.__name__
+        )
+        protected = self.circuit
+        if bulkhead is not None:
+            protected = AsyncBulkheadProxy(
+                self.circuit, **GlobalServiceProxy._bulkhead_options(service_cls, user_role, bulkhead)
             )
+        key_builder = CacheKeyBuilder()
+        self._cache = AsyncCachingProxy(protected, executor, coalesce=True, key_builder=key_builder)
+        self._proxy_pipeline = AsyncBufferedLoggingProxy(
+            AsyncRateLimitProxy(
+                self._cache,
+                executor,
+                key=user_role,
+                store=store,
+                call_limit=call_limit,
+                seconds_limit=seconds_limit,
+                algorithm=algorithm
+            ),
+            sink=sink,
+            key_builder=key_builder
         )
-        self._cache = CachingProxy(self.circuit)
-        self._proxy_pipeline = LoggingProxy(RateLimitProxy(self._cache))
 
-    def generate(self, *args, **kwargs):
-        return self._proxy_pipeline.generate(*args, **kwargs)
+    async def generate(self, *args, **kwargs):
+        return await self._proxy_pipeline.generate(*args, **kwargs)
+
+    async def close(self):
+        # Unir los hilos y escribir el sink bloquea, asi que se hace en el executor
+        await offload(self._executor, self._close)
+
+    def _close(self):
+        self._proxy_pipeline.close()
+        if self._batching is not None:
+            self._batching.close()
 
     @property
     def cache(self):
@@ -191,20 +2544,44 @@ class GlobalServiceProxy(Service):
     def circuit(self):
         return self._circuit
 
+def benchmark_compiled_vs_layered(iterations:int=100_000) -> dict:
+    # Costo por llamada de un acierto en cache; token_bucket es O(1) por llamada
+    proxy = GlobalServiceProxy(
+        ReportService,
+        user_role='admin',
+        store=LocalStateStore(),
+        call_limit=iterations * 4,
+        algorithm='token_bucket'
+    )
+    compiled = proxy.compile()
+    compiled(report_id=1)
+
+    timings = {}
+    for name, call in (('layered', proxy.generate), ('compiled', compiled)):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            call(report_id=1)
+        timings[name] = (time.perf_counter() - started) / iterations * 1e6
+
+    print(f"Cache hit por capas : {timings['layered']:.2f} µs/llamada")
+    print(f"Cache hit compilado : {timings['compiled']:.2f} µs/llamada")
+    print(f"Aceleracion         : x{timings['layered'] / timings['compiled']:.2f}")
+    return timings
+
 def test_access_control_blocks01():
-    proxy = GlobalServiceProxy(PaymentService, user_role="free")
+    proxy = GlobalServiceProxy(PaymentService, user_role="free", store=LocalStateStore())
     result = proxy.generate(user='juanito', amount=200)
     print(result)
     result = proxy.generate(user='banana', amount=150)
     print(result)
 
 def test_access_control_blocks02():
-    proxy = GlobalServiceProxy(ReportService, user_role="free")
+    proxy = GlobalServiceProxy(ReportService, user_role="free", store=LocalStateStore())
     with TestCase().assertRaises(PermissionError):
         proxy.generate(report_id=1)
 
 def test_cache_avoids_real_call():
-    proxy = GlobalServiceProxy(PaymentService, user_role="free")
+    proxy = GlobalServiceProxy(PaymentService, user_role="free", store=LocalStateStore())
 
     r1 = proxy.generate(user="a", amount=100)
     r2 = proxy.generate(user="a", amount=100)
@@ -216,7 +2593,7 @@ def test_cache_avoids_real_call():
     assert proxy.cache.cache_hits == 1
 
 def test_rate_limit():
-    proxy = GlobalServiceProxy(ImageService, user_role="premium")
+    proxy = GlobalServiceProxy(ImageService, user_role="premium", store=LocalStateStore())
 
     proxy.generate(image=b'muchos bytes')
     proxy.generate(image=b'muchos bytes')
@@ -231,7 +2608,7 @@ def test_circuit_breaker_opens():
         def generate(self, *args, **kwargs):
             raise Exception("fail")
 
-    proxy = GlobalServiceProxy(FakeService, user_role="admin")
+    proxy = GlobalServiceProxy(FakeService, user_role="admin", store=LocalStateStore())
 
     for attemp in range(3):
         with TestCase().assertRaises(PermissionError):
@@ -241,7 +2618,7 @@ def test_circuit_breaker_opens():
     assert proxy.circuit.state == "OPEN"
 
 def test_half_open_recovery():
-    proxy = GlobalServiceProxy(ReportService, user_role="admin")
+    proxy = GlobalServiceProxy(ReportService, user_role="admin", store=LocalStateStore())
     for id_report in range(1,4):
         with TestCase().assertRaises(TypeError):
             proxy.generate(param_no_exists=id_report)
@@ -253,7 +2630,7 @@ def test_half_open_recovery():
     assert proxy.circuit.state == "CLOSED"
 
 def test_cache_does_not_trigger_breaker():
-    proxy = GlobalServiceProxy(PaymentService, user_role="free")
+    proxy = GlobalServiceProxy(PaymentService, user_role="free", store=LocalStateStore())
 
     proxy.generate(user="a", amount=50)
     proxy.generate(user="a", amount=50)
@@ -261,6 +2638,620 @@ def test_cache_does_not_trigger_breaker():
     assert proxy.circuit.failure_count == 0
     assert proxy.circuit.state == "CLOSED"
 
+def test_cache_lru_eviction():
+    class EchoService(Service):
+        def generate(self, value):
+            return value
+
+    proxy = CachingProxy(EchoService(), max_entries=2)
+    proxy.generate(value=1)
+    proxy.generate(value=2)
+    proxy.generate(value=1)
+    proxy.generate(value=3)
+
+    assert proxy.evictions == 1
+    proxy.generate(value=1)
+    assert proxy.cache_hits == 2
+    proxy.generate(value=2)
+    assert proxy.real_call_count == 4
+
+def test_cache_ttl_expiration():
+    class EchoService(Service):
+        def generate(self, value):
+            return value
+
+    proxy = CachingProxy(EchoService(), ttl=0.05)
+    proxy.generate(value='a')
+    time.sleep(0.1)
+    proxy.generate(value='a')
+
+    assert proxy.real_call_count == 2
+    assert proxy.stats()['expirations'] == 1
+
+def test_cache_coalesces_concurrent_misses():
+    class SlowService(Service):
+        calls = 0
+        def generate(self, value):
+            SlowService.calls += 1
+            time.sleep(0.2)
+            return value * 2
+
+    proxy = CachingProxy(SlowService(), coalesce=True)
+    results = []
+    workers = [
+        threading.Thread(target=lambda: results.append(proxy.generate(value=21)))
+        for _ in range(8)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert results == [42] * 8
+    assert SlowService.calls == 1
+    assert proxy.real_call_count == 1
+    assert proxy.coalesced_calls == 7
+
+    # Un llamador que fallo en la cache justo antes de que el lider terminara no
+    # debe volver a llamar al servicio
+    cache_args = proxy._key_builder((), {'value': 21})
+    assert proxy._flights.do(cache_args, proxy._lead, cache_args, (), {'value': 21}) == 42
+    assert SlowService.calls == 1
+
+def test_async_pipeline_bridges_sync_service():
+    class EchoService(Service):
+        def generate(self, value):
+            time.sleep(0.1)
+            return value
+
+    async def run():
+        circuit = AsyncCircuitBreakerProxy(AsyncLazyLoadingProxy(EchoService))
+        cache = AsyncCachingProxy(circuit, coalesce=True)
+        proxy = AsyncLoggingProxy(AsyncRateLimitProxy(cache))
+        results = await asyncio.gather(*[proxy.generate(value=7) for _ in range(4)])
+        return results, cache, circuit
+
+    results, cache, circuit = asyncio.run(run())
+    assert results == [7, 7, 7, 7]
+    assert cache.real_call_count == 1
+    assert circuit.state == 'CLOSED'
+
+def test_rate_limit_algorithms_are_keyed():
+    for algorithm, limiter_cls in RATE_LIMIT_ALGORITHMS.items():
+        limiter = limiter_cls(call_limit=3, seconds_limit=60, store=LocalStateStore())
+        admitted = [limiter.try_acquire('free') <= 0 for _ in range(4)]
+        assert admitted == [True, True, True, False], algorithm
+        assert limiter.try_acquire('admin') <= 0, algorithm
+
+def test_rate_limit_shared_per_caller():
+    class EchoService(Service):
+        def generate(self, value):
+            return value
+
+    # Dos proxies creados por request para el mismo rol comparten el limite
+    first = RateLimitProxy(EchoService(), key='auditor', call_limit=2)
+    second = RateLimitProxy(EchoService(), key='auditor', call_limit=2)
+    first.generate(value=1)
+    second.generate(value=2)
+    with TestCase().assertRaises(RateLimitError):
+        first.generate(value=3)
+    RateLimitProxy(EchoService(), key='reviewer', call_limit=2).generate(value=4)
+
+def test_rate_limit_blocking_acquire():
+    class EchoService(Service):
+        def generate(self, value):
+            return value
+
+    proxy = RateLimitProxy(
+        EchoService(), call_limit=2, seconds_limit=0.2, algorithm='token_bucket', blocking=True, timeout=1
+    )
+    started = time.monotonic()
+    for value in range(4):
+        proxy.generate(value=value)
+    assert time.monotonic() - started >= 0.15
+
+    proxy = RateLimitProxy(
+        EchoService(), call_limit=1, seconds_limit=60, algorithm='gcra', blocking=True, timeout=0.1
+    )
+    proxy.generate(value=1)
+    with TestCase().assertRaises(RateLimitError):
+        proxy.generate(value=2)
+
+def test_shared_state_store_across_workers():
+    import tempfile
+
+    path = os.path.join(tempfile.mkdtemp(), 'proxy_state.bin')
+    worker_a, worker_b = MmapStateStore(path), MmapStateStore(path)
+
+    limiter_a = SlidingLogLimiter(call_limit=2, seconds_limit=60, store=worker_a)
+    limiter_b = SlidingLogLimiter(call_limit=2, seconds_limit=60, store=worker_b)
+    assert limiter_a.try_acquire('free') <= 0
+    assert limiter_b.try_acquire('free') <= 0
+    assert limiter_a.try_acquire('free') > 0
+
+    class FailingService(Service):
+        def generate(self, *args, **kwargs):
+            raise ValueError('fail')
+
+    circuit_a = CircuitBreakerProxy(FailingService(), store=worker_a, key='Report')
+    circuit_b = CircuitBreakerProxy(FailingService(), store=worker_b, key='Report')
+    for _ in range(3):
+        with TestCase().assertRaises(ValueError):
+            circuit_a.generate()
+    assert circuit_b.state == 'OPEN'
+    with TestCase().assertRaises(CircuitOpenError):
+        circuit_b.generate()
+
+    with TestCase().assertRaises(ValueError):
+        SlidingLogLimiter(call_limit=20, seconds_limit=60, store=worker_a)
+
+    worker_a.close()
+    worker_b.close()
+
+    small = MmapStateStore(os.path.join(tempfile.mkdtemp(), 'small.bin'), slots=4)
+    limiter = GCRALimiter(call_limit=1, seconds_limit=60, store=small)
+    for user in range(10):
+        assert limiter.try_acquire(f'user-{user}') <= 0
+    assert small.evictions == 6
+    small.update('temporal', lambda state: ((1.0,), None))
+    small.update('temporal', lambda state: (None, None))
+    assert small.get('temporal') is None
+    small.close()
+
+def test_disk_cache_survives_restart():
+    import tempfile
+
+    class CountingService(Service):
+        calls = 0
+        def generate(self, report_id):
+            CountingService.calls += 1
+            return f'reporte {report_id}'
+
+    path = os.path.join(tempfile.mkdtemp(), 'proxy_cache.sqlite')
+    disk = SqliteCacheStore(path, write_behind=True)
+    CachingProxy(CountingService(), disk_cache=disk).generate(report_id=1)
+    disk.close()
+
+    disk = SqliteCacheStore(path, max_bytes=64, compact_every=1)
+    restarted = CachingProxy(CountingService(), disk_cache=disk)
+    assert restarted.generate(report_id=1) == 'reporte 1'
+    assert restarted.disk_hits == 1 and CountingService.calls == 1
+
+    for report_id in range(2, 10):
+        restarted.generate(report_id=report_id)
+    assert disk.compactions > 0
+    disk.close()
+
+    disk = SqliteCacheStore(path)
+    CachingProxy(CountingService(), disk_cache=disk, ttl=0.05).generate(report_id=20)
+    time.sleep(0.1)
+    fresh = CachingProxy(CountingService(), disk_cache=disk, ttl=0.05)
+    fresh.generate(report_id=20)
+    assert fresh.disk_hits == 0 and disk.expirations == 1
+
+    disk.close()
+
+    blocked = SqliteCacheStore(path, write_behind=True)
+    blocker = sqlite3.connect(path, timeout=0, isolation_level=None)
+    blocker.execute('BEGIN IMMEDIATE')
+    blocked._conn.execute('PRAGMA busy_timeout=0')
+    blocked.set('bloqueada', 1)
+    blocked.flush()
+    blocker.execute('ROLLBACK')
+    assert blocked.write_errors == 1
+    blocked.set('libre', 2)
+    blocked.flush()
+    assert blocked.get('libre') == 2
+    blocked.close()
+    blocker.close()
+
+def test_cache_keys_digest_large_buffers():
+    builder = CacheKeyBuilder(min_digest_bytes=16, memoize=4)
+    image = b'x' * (4 * 1024 * 1024)
+
+    key = builder((), {'image': image})
+    assert key == builder((), {'image': bytearray(image)})
+    assert key[1][0][1][:2] == ('bytes', 'blake2b') and len(key[1][0][1][2]) == 16
+    builder((), {'image': image})
+    assert len(builder._memo) == 1
+
+    assert builder((), {'a': 1, 'b': 2}) == builder((), {'b': 2, 'a': 1})
+    assert builder((), {'a': 1, 'b': 2}) != builder((), {'a': 2, 'b': 1})
+
+    text = 'x' * 64
+    assert builder((text,), {}) != builder((text.encode(),), {})
+    assert builder((('a', 1),), {}) != builder((), {'a': 1})
+    assert builder(([1, 2],), {}) != builder(((1, 2),), {})
+    assert builder(({1: 'a', 'b': 2},), {}) == builder(({'b': 2, 1: 'a'},), {})
+
+    bounded = CacheKeyBuilder(min_digest_bytes=16, memoize=8, memoize_max_bytes=100)
+    buffers = [bytes([n]) * 60 for n in range(3)]
+    for buffer in buffers:
+        bounded((buffer,), {})
+    assert len(bounded._memo) == 1 and bounded._memo_bytes == 60
+
+def test_circuit_breaker_rolling_window():
+    class FlakyService(Service):
+        fail, delay = False, 0.0
+        def generate(self, value):
+            time.sleep(self.delay)
+            if self.fail:
+                raise ValueError('fail')
+            return value
+
+    service = FlakyService()
+    circuit = CircuitBreakerProxy(
+        service, minimum_calls=4, failure_rate_threshold=0.4, failure_timeout=0.05
+    )
+    for value in range(3):
+        circuit.generate(value=value)
+    service.fail = True
+    with TestCase().assertRaises(ValueError):
+        circuit.generate(value=3)
+    assert circuit.state == 'CLOSED'
+    with TestCase().assertRaises(ValueError):
+        circuit.generate(value=4)
+    assert circuit.state == 'OPEN'
+    with TestCase().assertRaises(CircuitOpenError):
+        circuit.generate(value=5)
+
+    time.sleep(0.1)
+    service.fail, service.delay = False, 0.05
+    worker = threading.Thread(target=circuit.generate, kwargs={'value': 6})
+    worker.start()
+    time.sleep(0.01)
+    with TestCase().assertRaises(CircuitOpenError):
+        circuit.generate(value=7)
+    worker.join()
+    assert circuit.state == 'CLOSED'
+
+    slow = CircuitBreakerProxy(service, minimum_calls=2, slow_call_threshold=0.02)
+    slow.generate(value=1)
+    slow.generate(value=2)
+    assert slow.state == 'OPEN' and slow.metrics()['p99_latency'] >= 0.02
+
+    window = RollingWindow(slow_threshold=0.01)
+    for _ in range(100):
+        window.record(True, 0.0094)
+    calls, _, slow_calls, p99 = window.snapshot()
+    assert calls == 100 and slow_calls == 0 and p99 <= 0.0094
+
+    class Interrupted(BaseException):
+        pass
+
+    class InterruptedService(Service):
+        interrupt = True
+        def generate(self, value):
+            if self.interrupt:
+                raise Interrupted()
+            return value
+
+    interrupted = InterruptedService()
+    probe = CircuitBreakerProxy(interrupted, failure_timeout=0.05)
+    probe._open()
+    time.sleep(0.1)
+    with TestCase().assertRaises(Interrupted):
+        probe.generate(value=1)
+    assert probe.state == 'HALF-OPEN'
+    interrupted.interrupt = False
+    assert probe.generate(value=2) == 2 and probe.state == 'CLOSED'
+
+    probe._store.update(probe._key, lambda state: ((2, time.time() - 1, 1, 0), None))
+    assert probe.generate(value=3) == 3 and probe.state == 'CLOSED'
+
+def test_batching_merges_concurrent_calls():
+    class BulkService(Service):
+        batches = []
+        def generate(self, value):
+            return value * 10
+        def generate_batch(self, calls):
+            BulkService.batches.append(len(calls))
+            time.sleep(0.05)
+            return [
+                ValueError(kwargs['value']) if kwargs['value'] < 0 else kwargs['value'] * 10
+                for _, kwargs in calls
+            ]
+
+    proxy = BatchingProxy(BulkService(), max_batch=4, max_wait=0.05)
+    results = {}
+    def call(value):
+        try:
+            results[value] = proxy.generate(value=value)
+        except ValueError as error:
+            results[value] = error
+
+    workers = [threading.Thread(target=call, args=(value,)) for value in (-1, 1, 2, 3, 4, 5)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert isinstance(results.pop(-1), ValueError)
+    assert results == {value: value * 10 for value in range(1, 6)}
+    assert sum(BulkService.batches) == 6 and max(BulkService.batches) <= 4
+    assert proxy.batch_count < 6
+    proxy.close()
+    assert proxy._flusher is None
+
+    idle = BatchingProxy(BulkService(), idle_timeout=0.05)
+    assert idle.generate(value=7) == 70
+    time.sleep(0.2)
+    assert idle._flusher is None
+
+    lazy_images = BatchingProxy(LazyLoadingProxy(ImageService))
+    assert lazy_images._generate_batch is None
+    assert hasattr(LazyLoadingProxy(ReportService), 'generate_batch')
+
+def test_buffered_logging_ring_buffer():
+    import io
+
+    class EchoService(Service):
+        def generate(self, value):
+            if value < 0:
+                raise ValueError(value)
+            return value
+
+    sink = io.StringIO()
+    proxy = BufferedLoggingProxy(EchoService(), sink=sink, capacity=4, flush_interval=60)
+    for value in range(6):
+        proxy.generate(value=value)
+    with TestCase().assertRaises(ValueError):
+        proxy.generate(value=-1)
+    proxy.close()
+
+    lines = sink.getvalue().splitlines()
+    assert len(lines) == 4 and proxy.buffer.dropped == 3
+    assert lines[-1].endswith('outcome: ValueError')
+    assert 'service: EchoService' in lines[0]
+
+    digests = [line.split('args: ')[1].split()[0] for line in lines]
+    assert digests[0] == BufferedLoggingProxy.arg_digest(CacheKeyBuilder()((), {'value': 3}))
+    unhashable = BufferedLoggingProxy(EchoService())
+    unhashable._record(time.monotonic(), ([1, 2],), {'options': {'a': 1}}, 'ok')
+    assert len(unhashable.format(unhashable.buffer.drain()[0]).split('args: ')[1].split()[0]) == 16
+
+    composite_sink = io.StringIO()
+    composite = GlobalServiceProxy(
+        PaymentService, user_role='free', store=LocalStateStore(), sink=composite_sink
+    )
+    composite.generate(user='a', amount=100)
+    composite.close()
+    assert 'service: RateLimitProxy' in composite_sink.getvalue()
+
+def test_compiled_pipeline_matches_layered():
+    import tempfile
+
+    class InstantReportService(ReportService):
+        def generate(self, report_id:int, copies:int=1):
+            return self._process(report_id) * copies
+
+    def build():
+        proxy = GlobalServiceProxy(ReportService, user_role='admin', store=LocalStateStore(), call_limit=4)
+        proxy._service_cls = InstantReportService
+        proxy._circuit._real_service._real_service._real_service = InstantReportService()
+        return proxy
+
+    layered, compiled_proxy = build(), build()
+    compiled = compiled_proxy.compile()
+    assert 'report_id, copies' in str(inspect.signature(compiled))
+
+    calls = [{'report_id': 1}, {'report_id': 1}, {'report_id': 7, 'copies': 2}]
+    expected = [layered.generate(**call) for call in calls]
+    assert expected == [compiled(call['report_id'], call.get('copies', 1)) for call in calls]
+    assert layered.cache.stats() == compiled_proxy.cache.stats()
+    assert layered.cache.cache_hits == compiled_proxy.cache.cache_hits == 1
+    assert len(compiled_proxy._proxy_pipeline.buffer.drain()) == 3
+
+    assert compiled(report_id=1) == layered.generate(report_id=1)
+    for call in (layered.generate, compiled):
+        with TestCase().assertRaises(RateLimitError):
+            call(report_id=1)
+    assert compiled_proxy._proxy_pipeline.buffer.drain()[-1][4] == 'RateLimitError'
+
+    denied = GlobalServiceProxy(ReportService, user_role='free', store=LocalStateStore()).compile()
+    with TestCase().assertRaises(PermissionError):
+        denied(report_id=1)
+
+    shared = GlobalServiceProxy(
+        ReportService, user_role='admin', store=MmapStateStore(os.path.join(tempfile.mkdtemp(), 'rl.bin'))
+    )
+    shared._circuit._real_service._real_service._real_service = InstantReportService()
+    assert shared.compile()(report_id=2) == InstantReportService().generate(report_id=2)
+
+def test_bulkhead_limits_concurrency():
+    class SlowService(Service):
+        running = peak = 0
+        def generate(self, value):
+            SlowService.running += 1
+            SlowService.peak = max(SlowService.peak, SlowService.running)
+            time.sleep(0.2)
+            SlowService.running -= 1
+            return value
+
+    proxy = BulkheadProxy(
+        SlowService(), registry=BulkheadRegistry(), max_concurrent=2, max_queue=2, queue_timeout=0.1
+    )
+    outcomes = []
+    def call(value):
+        try:
+            outcomes.append(proxy.generate(value=value))
+        except BulkheadFullError:
+            outcomes.append('rechazada')
+
+    workers = [threading.Thread(target=call, args=(value,)) for value in range(5)]
+    for worker in workers:
+        worker.start()
+        time.sleep(0.01)
+    for worker in workers:
+        worker.join()
+
+    metrics = proxy.metrics()
+    assert SlowService.peak == 2 and outcomes.count('rechazada') == 3
+    assert metrics['rejected'] == 1 and metrics['timed_out'] == 2 and metrics['max_queue_depth'] == 2
+    assert metrics['active'] == 0 and metrics['queue_depth'] == 0
+
+    patient = AsyncBulkheadProxy(SlowService(), registry=BulkheadRegistry(), max_concurrent=1, max_queue=4)
+
+    async def run():
+        return await asyncio.gather(*(patient.generate(value=value) for value in range(3)))
+
+    assert asyncio.run(run()) == [0, 1, 2]
+    assert patient.metrics()['max_queue_depth'] == 2 and patient.metrics()['max_wait'] >= 0.35
+
+    composed = GlobalServiceProxy(
+        PaymentService, user_role='free', store=LocalStateStore(), bulkhead={'max_concurrent': 1, 'per_role': True}
+    )
+    assert composed.cache._real_service.bulkhead is SHARED_BULKHEADS.get(('PaymentService', 'free'))
+
+def test_hedging_and_deadlines():
+    class TailService(Service):
+        def __init__(self, delay):
+            self.delay, self.calls = delay, 0
+        def generate(self, value):
+            self.calls += 1
+            time.sleep(self.delay)
+            return value, self.delay
+
+    slow, fast = TailService(0.5), TailService(0.01)
+    hedged = HedgingProxy(slow, replicas=[fast], hedge_delay=0.05)
+    started = time.monotonic()
+    assert hedged.generate(value=1) == (1, 0.01)
+    assert time.monotonic() - started < 0.3
+    assert hedged.hedges_sent == 1 and hedged.hedge_wins == 1 and fast.calls == 1
+
+    quick = HedgingProxy(TailService(0.01), hedge_delay=0.2)
+    assert quick.generate(value=2) == (2, 0.01) and quick.hedges_sent == 0
+
+    deadline = DeadlineProxy(TailService(0.3), timeout=0.05)
+    with TestCase().assertRaises(DeadlineExceededError):
+        deadline.generate(value=3)
+    assert deadline.expired == 1
+
+    class BudgetService(Service):
+        def generate(self):
+            return remaining_time()
+
+    budget = DeadlineProxy(BudgetService(), timeout=10)
+    with call_deadline(0.5):
+        assert 0 < budget.generate() <= 0.5
+        with TestCase().assertRaises(DeadlineExceededError):
+            DeadlineProxy(BudgetService(), min_remaining=1.0).generate()
+
+    async def run():
+        async_hedged = AsyncHedgingProxy(TailService(0.5), replicas=[TailService(0.01)], hedge_delay=0.05)
+        result = await async_hedged.generate(value=4)
+        async_deadline = AsyncDeadlineProxy(TailService(0.3), timeout=0.05)
+        with TestCase().assertRaises(DeadlineExceededError):
+            await async_deadline.generate(value=5)
+        return result
+
+    assert asyncio.run(run()) == (4, 0.01)
+
+def test_access_policy_table_reloads():
+    policy = AccessPolicy({'admin': ReportService, 'free': [PaymentService, ImageService]})
+    assert policy.allows('admin', ReportService) and policy.allows('admin', Service)
+    assert policy.allows('free', ImageService) and not policy.allows('free', ReportService)
+    assert not policy.allows('guest', ReportService)
+
+    proxy = AccessControlProxy(ReportService(), service_cls=ReportService, user_role='free', policy=policy)
+    with TestCase().assertRaises(PermissionError):
+        proxy._check()
+    policy.reload({'free': ReportService})
+    proxy._check()
+    assert policy.version == 2 and not policy.allows('admin', ReportService)
+
+    roles = {f'rol-{index}': type(f'Servicio{index}', (Service,), {}) for index in range(2000)}
+    large = AccessPolicy(roles)
+    assert large.allows('rol-1999', roles['rol-1999']) and not large.allows('rol-1999', roles['rol-0'])
+
+def test_cache_stale_while_revalidate_and_refresh_ahead():
+    class VersionedService(Service):
+        def __init__(self):
+            self.version = 0
+        def generate(self, key):
+            self.version += 1
+            time.sleep(0.05)
+            return key, self.version
+
+    service = VersionedService()
+    proxy = CachingProxy(service, ttl=0.1, stale_while_revalidate=1.0)
+    assert proxy.generate(key='a') == ('a', 1)
+    time.sleep(0.15)
+    started = time.monotonic()
+    assert proxy.generate(key='a') == ('a', 1)
+    assert time.monotonic() - started < 0.04 and proxy.stale_hits == 1
+    time.sleep(0.1)
+    assert proxy.generate(key='a') == ('a', 2) and proxy.refreshes == 1
+
+    ahead = CachingProxy(VersionedService(), ttl=0.3, refresh_ahead=0.2, refresh_min_hits=2)
+    ahead.generate(key='b')
+    ahead.generate(key='b')
+    time.sleep(0.15)
+    assert ahead.generate(key='b') == ('b', 1)
+    time.sleep(0.1)
+    assert ahead.refreshes == 1 and ahead.generate(key='b') == ('b', 2)
+
+    cold = CachingProxy(VersionedService(), ttl=0.3, refresh_ahead=0.2, refresh_min_hits=5)
+    cold.generate(key='c')
+    time.sleep(0.15)
+    cold.generate(key='c')
+    time.sleep(0.1)
+    assert cold.refreshes == 0
+
+    async def run():
+        stale = AsyncCachingProxy(VersionedService(), ttl=0.1, stale_while_revalidate=1.0)
+        await stale.generate(key='d')
+        await asyncio.sleep(0.15)
+        first = await stale.generate(key='d')
+        await asyncio.sleep(0.1)
+        return first, await stale.generate(key='d')
+
+    assert asyncio.run(run()) == (('d', 1), ('d', 2))
+
+def test_lazy_loading_and_pooled_instances():
+    class StatefulService(Service):
+        instances = 0
+        def __init__(self):
+            StatefulService.instances += 1
+            time.sleep(0.05)
+            self.busy = False
+        def generate(self, value):
+            assert not self.busy, 'instancia compartida entre hilos'
+            self.busy = True
+            time.sleep(0.05)
+            self.busy = False
+            return value
+
+    lazy = LazyLoadingProxy(StatefulService)
+    workers = [threading.Thread(target=lazy._get_service) for _ in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert StatefulService.instances == 1
+
+    StatefulService.instances = 0
+    pool = PooledLazyProxy(StatefulService, min_size=2, max_size=3, prewarm=True, idle_timeout=0.3)
+    pool._prewarmer.join()
+    assert pool.metrics()['idle'] == 2
+
+    results = []
+    workers = [threading.Thread(target=lambda value=value: results.append(pool.generate(value=value)))
+               for value in range(6)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert sorted(results) == list(range(6)) and StatefulService.instances == 3
+    assert pool.metrics()['in_use'] == 0 and pool.metrics()['waits'] > 0
+
+    with pool.lease() as first, pool.lease() as second, pool.lease() as third:
+        with TestCase().assertRaises(PoolExhaustedError):
+            pool.checkout(timeout=0.01)
+    time.sleep(0.35)
+    pool.checkout()
+    assert pool.metrics()['created'] == 2 and pool.evicted == 1
+
 
 if __name__ == '__main__':
     test_access_control_blocks01()
@@ -269,4 +3260,24 @@ if __name__ == '__main__':
     test_rate_limit()
     test_circuit_breaker_opens()
     test_half_open_recovery()
-    test_cache_does_not_trigger_breaker()
\ No newline at end of file
+    test_cache_does_not_trigger_breaker()
+    test_cache_lru_eviction()
+    test_cache_ttl_expiration()
+    test_cache_coalesces_concurrent_misses()
+    test_async_pipeline_bridges_sync_service()
+    test_rate_limit_algorithms_are_keyed()
+    test_rate_limit_shared_per_caller()
+    test_rate_limit_blocking_acquire()
+    test_shared_state_store_across_workers()
+    test_disk_cache_survives_restart()
+    test_cache_keys_digest_large_buffers()
+    test_circuit_breaker_rolling_window()
+    test_batching_merges_concurrent_calls()
+    test_buffered_logging_ring_buffer()
+    test_compiled_pipeline_matches_layered()
+    benchmark_compiled_vs_layered()
+    test_bulkhead_limits_concurrency()
+    test_hedging_and_deadlines()
+    test_access_policy_table_reloads()
+    test_cache_stale_while_revalidate_and_refresh_ahead()
+    test_lazy_loading_and_pooled_instances()
\ No newline at end of file
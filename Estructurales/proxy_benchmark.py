@@ -0,0 +1,375 @@
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import math
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+
+from proxy import (
+    AccessControlProxy,
+    AsyncCachingProxy,
+    AsyncGlobalServiceProxy,
+    AsyncService,
+    BufferedLoggingProxy,
+    BulkheadProxy,
+    BulkheadRegistry,
+    CachingProxy,
+    CircuitBreakerProxy,
+    GlobalServiceProxy,
+    LocalStateStore,
+    PooledLazyProxy,
+    RateLimitProxy,
+    ReportService,
+    Service,
+)
+
+# Carga sintetica para medir el costo de cada proxy y del pipeline completo.
+# Los servicios falsos son deterministas (semilla fija) y los generadores de
+# carga miden la latencia desde que la llamada debia empezar, asi una cola en
+# el open loop se ve en los percentiles en vez de esconderse
+
+class FakeServiceError(Exception):
+    pass
+
+class FakeService(Service):
+    # latency: ('constant', s) | ('uniform', min, max) | ('lognormal', mediana, sigma)
+
+    latency = ('constant', 0.0)
+    error_rate = 0.0
+    seed = 0
+    _instances = itertools.count()
+
+    def __init__(self):
+        self._random = random.Random(self.seed * 1_000_003 + next(self._instances))
+        self._lock = threading.Lock()
+
+    def generate(self, report_id:int):
+        delay, fail = self._sample()
+        if delay > 0:
+            time.sleep(delay)
+        return self._result(report_id, fail)
+
+    def _sample(self) -> tuple:
+        with self._lock:
+            kind, *params = self.latency
+            if kind == 'constant':
+                delay = params[0]
+            elif kind == 'uniform':
+                delay = self._random.uniform(*params)
+            elif kind == 'lognormal':
+                delay = self._random.lognormvariate(math.log(params[0]), params[1])
+            else:
+                raise ValueError(f'Distribucion de latencia desconocida: {kind}')
+            return delay, self._random.random() < self.error_rate
+
+    def _result(self, report_id:int, fail:bool):
+        if fail:
+            raise FakeServiceError(f'Fallo simulado para el reporte {report_id}')
+        return f'Reporte {report_id} generado'
+
+    @classmethod
+    def configured(cls, latency:tuple=('constant', 0.0), error_rate:float=0.0, seed:int=0) -> type:
+        # Subclase con el perfil fijado, para los proxies que reciben una clase
+        return type(cls.__name__, (cls,), {
+            'latency'    : latency,
+            'error_rate' : error_rate,
+            'seed'       : seed,
+            '_instances' : itertools.count(),
+        })
+
+class AsyncFakeService(FakeService, AsyncService):
+
+    async def generate(self, report_id:int):
+        delay, fail = self._sample()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self._result(report_id, fail)
+
+class LoadResult:
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, latency:float, error:Exception=None):
+        with self._lock:
+            self.latencies.append(latency)
+            if error is not None:
+                name = error.__class__.__name__
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self, elapsed:float) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            'requests'       : len(latencies),
+            'errors'         : dict(self.errors),
+            'elapsed_s'      : elapsed,
+            'throughput_rps' : len(latencies) / elapsed if elapsed else 0.0,
+            'p50_ms'         : percentile(latencies, 0.50) * 1000,
+            'p95_ms'         : percentile(latencies, 0.95) * 1000,
+            'p99_ms'         : percentile(latencies, 0.99) * 1000,
+            'max_ms'         : latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+def percentile(ordered:list, quantile:float) -> float:
+    # Rango mas cercano sobre una lista ya ordenada
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(quantile * len(ordered)) - 1))]
+
+def key_sequence(key_space:int, seed:int=0):
+    generator = random.Random(seed)
+    while True:
+        yield generator.randrange(key_space)
+
+def _timed_call(call, report_id:int, scheduled:float, result:LoadResult):
+    try:
+        call(report_id=report_id)
+        result.record(time.perf_counter() - scheduled)
+    except Exception as error:
+        result.record(time.perf_counter() - scheduled, error)
+
+async def _timed_call_async(call, report_id:int, scheduled:float, result:LoadResult):
+    try:
+        await call(report_id=report_id)
+        result.record(time.perf_counter() - scheduled)
+    except Exception as error:
+        result.record(time.perf_counter() - scheduled, error)
+
+def closed_loop(call, requests:int, concurrency:int=1, key_space:int=16, seed:int=0) -> dict:
+    # concurrency hilos que llaman sin pausa: cada uno espera su respuesta antes de la siguiente
+    keys = key_sequence(key_space, seed)
+    keys_lock = threading.Lock()
+    remaining = itertools.count()
+    result = LoadResult()
+
+    def worker():
+        while next(remaining) < requests:
+            with keys_lock:
+                report_id = next(keys)
+            _timed_call(call, report_id, time.perf_counter(), result)
+
+    workers = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return result.report(time.perf_counter() - started)
+
+def open_loop(call, rate:float, duration:float, max_workers:int=64, key_space:int=16, seed:int=0) -> dict:
+    # Llegadas de Poisson a rate por segundo, sin importar si el sistema da abasto
+    keys, arrivals = key_sequence(key_space, seed), random.Random(seed + 1)
+    result = LoadResult()
+    started = scheduled = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while scheduled - started < duration:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(_timed_call, call, next(keys), scheduled, result)
+            scheduled += arrivals.expovariate(rate)
+    return result.report(time.perf_counter() - started)
+
+async def closed_loop_async(call, requests:int, concurrency:int=1, key_space:int=16, seed:int=0) -> dict:
+    keys = key_sequence(key_space, seed)
+    remaining = itertools.count()
+    result = LoadResult()
+
+    async def worker():
+        while next(remaining) < requests:
+            await _timed_call_async(call, next(keys), time.perf_counter(), result)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return result.report(time.perf_counter() - started)
+
+async def open_loop_async(call, rate:float, duration:float, key_space:int=16, seed:int=0) -> dict:
+    keys, arrivals = key_sequence(key_space, seed), random.Random(seed + 1)
+    result = LoadResult()
+    tasks = []
+    started = scheduled = time.perf_counter()
+    while scheduled - started < duration:
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(_timed_call_async(call, next(keys), scheduled, result)))
+        scheduled += arrivals.expovariate(rate)
+    await asyncio.gather(*tasks)
+    return result.report(time.perf_counter() - started)
+
+def measure_allocations(call, requests:int, key_space:int=16, seed:int=0) -> dict:
+    # Se mide aparte porque tracemalloc hace mucho mas lenta cada asignacion
+    keys = key_sequence(key_space, seed)
+    call(report_id=next(keys))
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for _ in range(requests):
+            try:
+                call(report_id=next(keys))
+            except Exception:
+                pass
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'retained_bytes_per_call' : (after - before) / requests,
+        'peak_bytes'              : peak - before,
+    }
+
+def build_scenarios(service_cls:type, requests:int) -> dict:
+    # Cada proxy solo sobre el servicio falso y el pipeline completo, por capas y compilado
+    limit = requests * 10
+    pool = PooledLazyProxy(service_cls, max_size=64)
+    pipeline = GlobalServiceProxy(
+        ReportService, user_role='admin', store=LocalStateStore(), call_limit=limit,
+        algorithm='token_bucket', pool=pool
+    )
+    return {
+        'baseline'         : service_cls().generate,
+        'buffered_logging' : BufferedLoggingProxy(service_cls()).generate,
+        'rate_limit'       : RateLimitProxy(
+            service_cls(), call_limit=limit, algorithm='token_bucket', store=LocalStateStore()
+        ).generate,
+        'caching'          : CachingProxy(service_cls()).generate,
+        'circuit_breaker'  : CircuitBreakerProxy(service_cls(), minimum_calls=limit).generate,
+        'access_control'   : AccessControlProxy(
+            service_cls(), service_cls=ReportService, user_role='admin'
+        ).generate,
+        'bulkhead'         : BulkheadProxy(
+            service_cls(), registry=BulkheadRegistry(), max_concurrent=64, max_queue=limit
+        ).generate,
+        'global'           : pipeline.generate,
+        'global_compiled'  : pipeline.compile(),
+    }
+
+def build_async_scenarios(service_cls:type, requests:int) -> dict:
+    pipeline = AsyncGlobalServiceProxy(
+        ReportService, user_role='admin', store=LocalStateStore(), call_limit=requests * 10,
+        algorithm='token_bucket', pool=PooledLazyProxy(service_cls, max_size=64)
+    )
+    async_cls = AsyncFakeService.configured(service_cls.latency, service_cls.error_rate, service_cls.seed)
+    return {
+        'baseline' : async_cls().generate,
+        'caching'  : AsyncCachingProxy(async_cls()).generate,
+        'global'   : pipeline.generate,
+    }
+
+def run_benchmarks(
+    mode:str='closed',
+    requests:int=2000,
+    concurrency:int=8,
+    rate:float=500,
+    duration:float=2.0,
+    latency:tuple=('constant', 0.0),
+    error_rate:float=0.0,
+    key_space:int=16,
+    seed:int=0,
+    allocations:bool=True,
+    scenarios:list=None
+) -> dict:
+    service_cls = FakeService.configured(latency, error_rate, seed)
+    report = {
+        'mode'        : mode,
+        'python'      : sys.version.split()[0],
+        'service'     : {'latency': list(latency), 'error_rate': error_rate, 'seed': seed},
+        'load'        : {'requests': requests, 'concurrency': concurrency, 'rate': rate,
+                         'duration': duration, 'key_space': key_space},
+        'scenarios'   : {},
+    }
+    # Los proxies imprimen en cada fallo de cache o instancia nueva; no es parte de lo medido
+    with redirect_stdout(io.StringIO()):
+        if mode.startswith('async'):
+            calls = build_async_scenarios(service_cls, requests)
+        else:
+            calls = build_scenarios(service_cls, requests)
+        for name, call in calls.items():
+            if scenarios and name not in scenarios:
+                continue
+            if mode == 'closed':
+                result = closed_loop(call, requests, concurrency, key_space, seed)
+            elif mode == 'open':
+                result = open_loop(call, rate, duration, key_space=key_space, seed=seed)
+            elif mode == 'async-closed':
+                result = asyncio.run(closed_loop_async(call, requests, concurrency, key_space, seed))
+            elif mode == 'async-open':
+                result = asyncio.run(open_loop_async(call, rate, duration, key_space, seed))
+            else:
+                raise ValueError(f'Modo de carga desconocido: {mode}')
+            if allocations and not mode.startswith('async'):
+                result['allocations'] = measure_allocations(call, min(requests, 1000), key_space, seed)
+            report['scenarios'][name] = result
+    return report
+
+def parse_latency(text:str) -> tuple:
+    # "constant:0.001", "uniform:0.0005:0.002" o "lognormal:0.001:0.5"
+    kind, *params = text.split(':')
+    return (kind, *map(float, params))
+
+def main(argv:list=None):
+    parser = argparse.ArgumentParser(description='Benchmark de los proxies de proxy.py')
+    parser.add_argument('--mode', choices=('closed', 'open', 'async-closed', 'async-open'), default='closed')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=500, help='llegadas por segundo (open loop)')
+    parser.add_argument('--duration', type=float, default=2.0, help='segundos de carga (open loop)')
+    parser.add_argument('--latency', type=parse_latency, default=('constant', 0.0))
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--key-space', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-allocations', action='store_true')
+    parser.add_argument('--scenario', action='append', help='limita la corrida a estos escenarios')
+    parser.add_argument('--output', help='archivo JSON; por defecto se escribe en stdout')
+    options = parser.parse_args(argv)
+
+    report = run_benchmarks(
+        mode=options.mode,
+        requests=options.requests,
+        concurrency=options.concurrency,
+        rate=options.rate,
+        duration=options.duration,
+        latency=options.latency,
+        error_rate=options.error_rate,
+        key_space=options.key_space,
+        seed=options.seed,
+        allocations=not options.no_allocations,
+        scenarios=options.scenario,
+    )
+    text = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as output:
+            output.write(text)
+    else:
+        print(text)
+    return report
+
+def test_benchmark_harness_reports():
+    report = run_benchmarks(requests=200, concurrency=4, error_rate=0.1, scenarios=['baseline', 'global'])
+    baseline, pipeline = report['scenarios']['baseline'], report['scenarios']['global']
+    assert baseline['requests'] == pipeline['requests'] == 200
+    assert baseline['errors'].get('FakeServiceError', 0) > 0
+    assert 0 <= baseline['p50_ms'] <= baseline['p95_ms'] <= baseline['p99_ms'] <= baseline['max_ms']
+    assert 'retained_bytes_per_call' in pipeline['allocations']
+    json.dumps(report)
+
+    first = [FakeService.configured(('uniform', 0.0, 1.0), seed=7)()._sample() for _ in range(3)]
+    second = [FakeService.configured(('uniform', 0.0, 1.0), seed=7)()._sample() for _ in range(3)]
+    assert first == second
+
+    async_report = run_benchmarks(mode='async-closed', requests=100, concurrency=4, scenarios=['global'])
+    assert async_report['scenarios']['global']['requests'] == 100
+
+
+if __name__ == '__main__':
+    main()